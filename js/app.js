@@ -38,12 +38,22 @@ const App = (() => {
     }
   }
 
-  function setCachedCatalog(sections) {
+  // Хэш содержимого каталога (поле hash в index.json) из кэша
+  function getCachedCatalogHash() {
+    try {
+      return JSON.parse(localStorage.getItem(CACHE_KEY)).hash || null;
+    } catch {
+      return null;
+    }
+  }
+
+  function setCachedCatalog(sections, hash) {
     try {
       localStorage.setItem(
         CACHE_KEY,
         JSON.stringify({
           timestamp: Date.now(),
+          hash: hash || null,
           sections,
         }),
       );
@@ -62,8 +72,10 @@ const App = (() => {
         .then((data) => {
           if (data) {
             const sections = data.sections || [];
-            setCachedCatalog(sections);
-            onUpdate(sections);
+            // Тот же хэш — каталог не менялся, перерисовывать нечего
+            const unchanged = data.hash && data.hash === getCachedCatalogHash();
+            setCachedCatalog(sections, data.hash);
+            if (!unchanged) onUpdate(sections);
           }
         })
         .catch(() => {});
@@ -75,7 +87,7 @@ const App = (() => {
       if (!response.ok) throw new Error(`HTTP ${response.status}`);
       const data = await response.json();
       const sections = data.sections || [];
-      setCachedCatalog(sections);
+      setCachedCatalog(sections, data.hash);
       return sections;
     } catch (e) {
       // При ошибке сети — используем кэш
@@ -1,6 +1,7 @@
 /**
  * KML/KMZ парсер для VeloTrek.
- * Извлекает маршруты, POI и статистику из KML-файлов.
+ * Извлекает маршруты, POI и статистику из KML-файлов,
+ * а также из GPX, TCX и GeoJSON — в ту же структуру.
  */
 const KMLParser = (() => {
   const KML_NS = 'http://www.opengis.net/kml/2.2';
@@ -14,14 +15,7 @@ const KMLParser = (() => {
       throw new Error('Некорректный KML-файл');
     }
 
-    const result = {
-      name: '',
-      description: '',
-      stats: {},
-      pois: [],
-      segments: [],
-      bbox: { minLat: 90, maxLat: -90, minLon: 180, maxLon: -180 }
-    };
+    const result = emptyResult();
 
     const docEl = doc.getElementsByTagNameNS(KML_NS, 'Document')[0];
     if (!docEl) {
@@ -66,6 +60,62 @@ const KMLParser = (() => {
       }
     }
 
+    // Ссылки NetworkLink/Link/href — по ним loadFromUrl находит другие KML в KMZ
+    result.links = [];
+    for (const nl of doc.getElementsByTagNameNS(KML_NS, 'NetworkLink')) {
+      const link = [...nl.children].find(el => el.localName === 'Link' && el.namespaceURI === KML_NS);
+      const href = link && (getTextNS(link, 'href') || '').trim();
+      if (href) result.links.push(href);
+    }
+
+    return finish(result);
+  }
+
+  /**
+   * Объединяет разобранные KML одного KMZ в один маршрут — как merge_routes
+   * в генераторе: название и описание из первого документа, где они есть.
+   */
+  function mergeResults(results) {
+    if (results.length === 1) return results[0];
+    const merged = emptyResult();
+    for (const r of results) {
+      merged.name = merged.name || r.name;
+      merged.description = merged.description || r.description;
+      for (const seg of r.segments) addSegment(merged, seg);
+      for (const poi of r.pois) addPoi(merged, poi);
+    }
+    return finish(merged);
+  }
+
+  /** Имя KML в архиве, на который ведёт href из документа base, или null */
+  function kmzLinkTarget(zip, base, href) {
+    if (href.includes('://') || href.startsWith('/')) return null;
+    const parts = base.split('/').slice(0, -1);
+    for (const part of href.split('#')[0].split('/')) {
+      if (part === '..') {
+        if (!parts.length) return null;
+        parts.pop();
+      } else if (part && part !== '.') {
+        parts.push(part);
+      }
+    }
+    const name = parts.join('/');
+    return /\.kml$/i.test(name) && zip.file(name) ? name : null;
+  }
+
+  function emptyResult() {
+    return {
+      name: '',
+      description: '',
+      stats: {},
+      pois: [],
+      segments: [],
+      bbox: { minLat: 90, maxLat: -90, minLon: 180, maxLon: -180 }
+    };
+  }
+
+  /** Статистика по координатам — общая для всех форматов */
+  function finish(result) {
     // Вычисляем track_km — суммарная длина всех сегментов по координатам
     let trackKm = 0;
     for (const seg of result.segments) {
@@ -92,6 +142,166 @@ const KMLParser = (() => {
     return result;
   }
 
+  /** Добавить сегмент [[lat, lon, ele], ...] и расширить bbox */
+  function addSegment(result, segment) {
+    if (segment.length === 0) return;
+    result.segments.push(segment);
+    for (const [lat, lon] of segment) {
+      updateBBox(result.bbox, lat, lon);
+    }
+  }
+
+  function addPoi(result, poi) {
+    if (!Number.isFinite(poi.lat) || !Number.isFinite(poi.lon)) return;
+    result.pois.push(poi);
+    updateBBox(result.bbox, poi.lat, poi.lon);
+  }
+
+  function parseXml(text, format) {
+    const doc = new DOMParser().parseFromString(text, 'text/xml');
+    if (doc.querySelector('parsererror')) {
+      throw new Error(`Некорректный ${format}-файл`);
+    }
+    return doc;
+  }
+
+  /** Текст первого прямого потомка с таким локальным именем (в любом namespace) */
+  function childText(parent, localName) {
+    for (const child of parent.children) {
+      if (child.localName === localName) return child.textContent.trim();
+    }
+    return '';
+  }
+
+  function parseGpx(text) {
+    const doc = parseXml(text, 'GPX');
+    const result = emptyResult();
+    const root = doc.documentElement;
+    const meta = [...root.children].find(el => el.localName === 'metadata');
+    const firstTrack = [...root.children].find(el => el.localName === 'trk' || el.localName === 'rte');
+    for (const el of [meta, root, firstTrack]) {
+      if (!el) continue;
+      result.name = result.name || childText(el, 'name');
+      result.description = result.description || childText(el, 'desc');
+    }
+
+    for (const wpt of doc.getElementsByTagNameNS('*', 'wpt')) {
+      addPoi(result, {
+        name: childText(wpt, 'name'),
+        description: childText(wpt, 'desc'),
+        lat: parseFloat(wpt.getAttribute('lat')),
+        lon: parseFloat(wpt.getAttribute('lon')),
+        elevation: parseFloat(childText(wpt, 'ele')) || 0
+      });
+    }
+    const toPoint = pt => [
+      parseFloat(pt.getAttribute('lat')),
+      parseFloat(pt.getAttribute('lon')),
+      parseFloat(childText(pt, 'ele')) || 0
+    ];
+    for (const seg of doc.getElementsByTagNameNS('*', 'trkseg')) {
+      addSegment(result, [...seg.getElementsByTagNameNS('*', 'trkpt')].map(toPoint)
+        .filter(p => Number.isFinite(p[0]) && Number.isFinite(p[1])));
+    }
+    for (const rte of doc.getElementsByTagNameNS('*', 'rte')) {
+      addSegment(result, [...rte.getElementsByTagNameNS('*', 'rtept')].map(toPoint)
+        .filter(p => Number.isFinite(p[0]) && Number.isFinite(p[1])));
+    }
+    return finish(result);
+  }
+
+  function parseTcx(text) {
+    const doc = parseXml(text, 'TCX');
+    const result = emptyResult();
+    const course = doc.getElementsByTagNameNS('*', 'Course')[0];
+    const activity = doc.getElementsByTagNameNS('*', 'Activity')[0];
+    if (course) {
+      result.name = childText(course, 'Name');
+      result.description = childText(course, 'Notes');
+    } else if (activity) {
+      result.description = childText(activity, 'Notes');
+    }
+
+    const position = el => {
+      const pos = [...el.children].find(c => c.localName === 'Position');
+      if (!pos) return null;
+      const lat = parseFloat(childText(pos, 'LatitudeDegrees'));
+      const lon = parseFloat(childText(pos, 'LongitudeDegrees'));
+      return Number.isFinite(lat) && Number.isFinite(lon) ? [lat, lon] : null;
+    };
+    for (const track of doc.getElementsByTagNameNS('*', 'Track')) {
+      const segment = [];
+      for (const tp of track.getElementsByTagNameNS('*', 'Trackpoint')) {
+        const pos = position(tp);
+        if (pos) segment.push([pos[0], pos[1], parseFloat(childText(tp, 'AltitudeMeters')) || 0]);
+      }
+      addSegment(result, segment);
+    }
+    for (const cp of doc.getElementsByTagNameNS('*', 'CoursePoint')) {
+      const pos = position(cp);
+      if (pos) addPoi(result, { name: childText(cp, 'Name'), description: '', lat: pos[0], lon: pos[1], elevation: 0 });
+    }
+    return finish(result);
+  }
+
+  function parseGeoJson(text) {
+    let data;
+    try {
+      data = JSON.parse(text);
+    } catch (e) {
+      throw new Error('Некорректный GeoJSON-файл');
+    }
+    const result = emptyResult();
+    const features = data.type === 'FeatureCollection' ? data.features || []
+      : data.type === 'Feature' ? [data]
+      : [{ type: 'Feature', properties: {}, geometry: data }];
+
+    // Испорченные позиции (null, не массив, нечисловые координаты) пропускаются,
+    // как и в генераторе (route_formats._position)
+    const num = v => (v === null || v === '' || typeof v === 'boolean' || Array.isArray(v)) ? NaN : Number(v);
+    const position = c => {
+      if (!Array.isArray(c) || c.length < 2) return null;
+      const lat = num(c[1]), lon = num(c[0]), ele = num(c[2]);
+      if (!Number.isFinite(lat) || !Number.isFinite(lon)) return null;
+      return [lat, lon, Number.isFinite(ele) ? ele : 0];
+    };
+    const line = coords => (Array.isArray(coords) ? coords : []).map(position).filter(Boolean);
+    const addGeometry = (geometry, props) => {
+      if (!geometry) return;
+      const point = geometry.type === 'Point' && position(geometry.coordinates);
+      if (point) {
+        addPoi(result, {
+          name: props.name || props.title || '',
+          description: props.description || props.desc || '',
+          lat: point[0],
+          lon: point[1],
+          elevation: point[2]
+        });
+      } else if (geometry.type === 'LineString') {
+        addSegment(result, line(geometry.coordinates));
+        result.name = result.name || props.name || '';
+        result.description = result.description || props.description || props.desc || '';
+      } else if (geometry.type === 'MultiLineString') {
+        for (const coords of Array.isArray(geometry.coordinates) ? geometry.coordinates : []) {
+          addSegment(result, line(coords));
+        }
+        result.name = result.name || props.name || '';
+        result.description = result.description || props.description || props.desc || '';
+      } else if (geometry.type === 'GeometryCollection') {
+        const parts = Array.isArray(geometry.geometries) ? geometry.geometries : [];
+        for (const part of parts) addGeometry(part, props);
+      }
+    };
+    for (const feature of features) {
+      const props = feature && feature.properties;
+      if (feature) addGeometry(feature.geometry, props && typeof props === 'object' && !Array.isArray(props) ? props : {});
+    }
+    // Название корня — главнее, чем у отдельных линий
+    result.name = data.name || result.name;
+    result.description = data.description || result.description;
+    return finish(result);
+  }
+
   function haversineKm(lat1, lon1, lat2, lon2) {
     const R = 6371;
     const dLat = (lat2 - lat1) * Math.PI / 180;
@@ -197,18 +407,37 @@ const KMLParser = (() => {
     const response = await fetch(url);
     if (!response.ok) throw new Error(`Ошибка загрузки: ${response.status}`);
 
-    if (url.endsWith('.kmz')) {
+    const path = url.toLowerCase();
+    if (path.endsWith('.kmz')) {
       const buffer = await response.arrayBuffer();
       const zip = await JSZip.loadAsync(buffer);
       const kmlFile = zip.file('doc.kml') || zip.file(/\.kml$/i)[0];
       if (!kmlFile) throw new Error('В KMZ не найден файл KML');
-      const kmlText = await kmlFile.async('string');
-      return parse(kmlText);
-    } else {
-      const kmlText = await response.text();
-      return parse(kmlText);
+      // Корневой документ и KML, на которые он ссылается через NetworkLink;
+      // остальные KML архива (старые копии) в маршрут не попадают
+      const results = [];
+      const queue = [kmlFile.name];
+      const seen = new Set(queue);
+      while (queue.length) {
+        const name = queue.shift();
+        const result = parse(await zip.file(name).async('string'));
+        results.push(result);
+        for (const href of result.links) {
+          const target = kmzLinkTarget(zip, name, href);
+          if (target && !seen.has(target)) {
+            seen.add(target);
+            queue.push(target);
+          }
+        }
+      }
+      return mergeResults(results);
     }
+    const text = await response.text();
+    if (path.endsWith('.gpx')) return parseGpx(text);
+    if (path.endsWith('.tcx')) return parseTcx(text);
+    if (path.endsWith('.geojson')) return parseGeoJson(text);
+    return parse(text);
   }
 
-  return { parse, loadFromUrl };
+  return { parse, parseGpx, parseTcx, parseGeoJson, loadFromUrl };
 })();
@@ -0,0 +1,135 @@
+"""
+VeloTrek — синтетические KML/KMZ для бенчмарков генератора.
+
+Трек — детерминированное случайное блуждание под Москвой (шаг ~20 м,
+холмистый профиль высот), разбитое на плейсмарки: обычные LineString,
+часть — MultiGeometry из двух линий, плюс точки POI и большое
+CDATA-описание документа. Файл пишется потоково, так что фикстуры на
+миллионы точек не требуют памяти под весь текст.
+"""
+
+import io
+import math
+import random
+import zipfile
+from pathlib import Path
+
+START_LAT = 55.75
+START_LON = 37.60
+STEP_DEG = 0.0002  # ~20 м
+
+
+def true_elevation(i: int) -> float:
+    """Высота точки i без шума — «настоящий» рельеф фикстуры."""
+    return 150 + 40 * math.sin(i / 400) + 10 * math.sin(i / 37)
+
+
+def true_climb(vertices: int, placemarks: int = 10) -> float:
+    """Набор высоты по рельефу без шума — эталон для сравнения способов подсчёта.
+
+    Считается внутри тех же кусков трека, на которые write_kml режет
+    плейсмарки (между линиями подъём не считается и генератором).
+    """
+    per_placemark = max(1, vertices // max(1, placemarks))
+    bounds = set()
+    written = index = 0
+    while written < vertices:
+        count = min(per_placemark, vertices - written)
+        bounds.add(written)
+        if index % 3 == 2 and count >= 4:
+            bounds.add(written + count // 2)
+        written += count
+        index += 1
+    return sum(
+        max(0.0, true_elevation(i) - true_elevation(i - 1))
+        for i in range(1, vertices) if i not in bounds
+    )
+
+
+def track_points(vertices: int, seed: int = 1):
+    """Генератор точек (lon, lat, ele) — порядок как в KML."""
+    rng = random.Random(seed)
+    lat, lon = START_LAT, START_LON
+    heading = rng.uniform(0, 2 * math.pi)
+    for i in range(vertices):
+        heading += rng.gauss(0, 0.3)
+        lat += STEP_DEG * math.cos(heading)
+        lon += STEP_DEG * math.sin(heading) * 1.8
+        ele = true_elevation(i) + rng.gauss(0, 1.5)
+        yield lon, lat, ele
+
+
+def coordinates_text(vertices: int, seed: int = 1) -> str:
+    """Содержимое одного <coordinates> на vertices точек."""
+    return "\n".join(f"{lon:.6f},{lat:.6f},{ele:.1f}" for lon, lat, ele in track_points(vertices, seed))
+
+
+def _write_document(f, vertices: int, placemarks: int, pois: int, description_kb: int, seed: int):
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<kml xmlns="http://www.opengis.net/kml/2.2">\n  <Document>\n'
+            f"    <name>Синтетический маршрут, {vertices} точек</name>\n")
+    paragraph = "<p>Маршрут холмист, живописен, немало спусков в пойму и подъёмов на высокий берег.</p>\n"
+    repeat = max(1, description_kb * 1024 // len(paragraph.encode("utf-8")))
+    f.write(f"    <description><![CDATA[{paragraph * repeat}]]></description>\n")
+
+    rng = random.Random(seed + 1)
+    for i in range(pois):
+        lon = START_LON + rng.uniform(-0.3, 0.3)
+        lat = START_LAT + rng.uniform(-0.2, 0.2)
+        f.write(f"    <Placemark>\n      <name>POI {i + 1}</name>\n"
+                f"      <Point><coordinates>{lon:.6f},{lat:.6f},150.0</coordinates></Point>\n"
+                "    </Placemark>\n")
+
+    per_placemark = max(1, vertices // max(1, placemarks))
+    points = track_points(vertices, seed)
+    written = 0
+    index = 0
+    while written < vertices:
+        count = min(per_placemark, vertices - written)
+        # Каждый третий плейсмарк — MultiGeometry из двух линий
+        parts = [count // 2, count - count // 2] if index % 3 == 2 and count >= 4 else [count]
+        f.write(f"    <Placemark>\n      <name>День {index + 1}</name>\n")
+        if len(parts) > 1:
+            f.write("      <MultiGeometry>\n")
+        for part in parts:
+            f.write("        <LineString>\n          <coordinates>\n")
+            for _ in range(part):
+                lon, lat, ele = next(points)
+                f.write(f"            {lon:.6f},{lat:.6f},{ele:.1f}\n")
+            f.write("          </coordinates>\n        </LineString>\n")
+        if len(parts) > 1:
+            f.write("      </MultiGeometry>\n")
+        f.write("    </Placemark>\n")
+        written += count
+        index += 1
+
+    f.write("  </Document>\n</kml>\n")
+
+
+def write_kml(path: Path, vertices: int, placemarks: int = 10, pois: int = 40,
+              description_kb: int = 64, seed: int = 1) -> Path:
+    """Пишет синтетический KML и возвращает путь к нему."""
+    with open(path, "w", encoding="utf-8") as f:
+        _write_document(f, vertices, placemarks, pois, description_kb, seed)
+    return path
+
+
+def write_kmz(path: Path, vertices: int, placemarks: int = 10, pois: int = 40,
+              description_kb: int = 64, seed: int = 1) -> Path:
+    """То же, что write_kml, но упакованное в KMZ (doc.kml внутри)."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        with z.open("doc.kml", "w") as raw, io.TextIOWrapper(raw, encoding="utf-8") as f:
+            _write_document(f, vertices, placemarks, pois, description_kb, seed)
+    return path
+
+
+def write_routes_tree(root: Path, vertices: int, files: int = 4) -> Path:
+    """Папка routes/ с одним разделом из files маршрутов (KML и KMZ вперемешку)."""
+    section = root / "routes" / "Синтетика"
+    section.mkdir(parents=True, exist_ok=True)
+    per_file = max(1, vertices // files)
+    for i in range(files):
+        writer = write_kmz if i % 2 else write_kml
+        suffix = ".kmz" if i % 2 else ".kml"
+        writer(section / f"{i + 1:02d}-synthetic{suffix}", per_file, seed=i + 1)
+    return root / "routes"
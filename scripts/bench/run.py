@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+VeloTrek — бенчмарки генератора каталога.
+
+Для каждого размера синтезирует фикстуры (scripts/bench/fixtures.py) и
+замеряет parse_coordinates (чистый Python), parse_coordinates_array
+(путь NumPy, который выбирает parse_kml), parse_kml, calc_elevation_stats,
+simplify и simplify_python (упрощение трека карточки и уровни превью —
+выбранным путём и принудительно без NumPy), load_route_file (KMZ) и
+полный generate_index. elevation_methods прогоняет все способы подсчёта
+высот (scripts/route_elevation.py) на фикстуре и на настоящем каталоге
+routes/: время и ошибка набора высоты относительно рельефа фикстуры без
+шума; --elevation-windows добавляет перебор ширины окна сглаживания.
+Каждый замер идёт в отдельном процессе, чтобы пиковый RSS относился
+только к нему. Результат — JSON: время, точек в секунду и пиковый RSS по
+каждому замеру.
+
+    python3 scripts/bench/run.py
+    python3 scripts/bench/run.py --sizes 10000 1000000 5000000 --repeat 3 -o bench.json
+    python3 scripts/bench/run.py --bench elevation_methods --elevation-windows 3 5 9 500
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import fixtures  # noqa: E402
+import index_generator  # noqa: E402
+import route_elevation  # noqa: E402
+import route_formats  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows — пиковый RSS не измеряется
+    resource = None
+
+BENCHMARKS = ("parse_coordinates", "parse_coordinates_array", "parse_kml", "calc_elevation_stats",
+              "simplify", "simplify_python", "elevation_methods",
+              "load_route_file", "generate_index")
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def redirect_generator(generator, routes_dir: Path):
+    """Направляет все пути генератора во временную папку routes/."""
+    generator.ROUTES_DIR = routes_dir
+    generator.OUTPUT_FILE = routes_dir / "index.json"
+    generator.CACHE_FILE = routes_dir / ".index-cache.json"
+    generator.GEOMETRY_FILE = routes_dir / "geometry.json"
+    generator.TILES_FILE = routes_dir / "tiles.json"
+    generator.CATALOG_FILE = routes_dir / "catalog.json"
+    generator.DETAILS_DIR = routes_dir / "details"
+    generator.SPATIAL_FILE = routes_dir / "spatial.json"
+    generator.OVERLAPS_FILE = routes_dir / "overlaps.json"
+
+
+def elevation_methods(generator, kml: Path, vertices: int, windows=(None,)) -> list:
+    """Все сочетания сглаживания, окна и подсчёта на фикстуре и на каталоге routes/.
+
+    windows — ширины окна (None — окно способа по умолчанию); окна, которые
+    способу не подходят (чётное для savgol, любое для none), пропускаются.
+    """
+    with open(kml, "rb") as f:
+        meta = generator.parse_kml(f)
+    catalog = [
+        generator.load_route_file(path)
+        for path in sorted(generator.ROUTES_DIR.glob("*/*"))
+        if path.suffix.lower() in route_formats.ROUTE_SUFFIXES
+    ]
+    truth = fixtures.true_climb(vertices)
+    methods = []
+    for smoothing, window, climb in itertools.product(route_elevation.SMOOTHING, windows, route_elevation.CLIMB):
+        if window is not None and smoothing == "none":
+            continue
+        try:
+            route_elevation.configure(smoothing, climb, window)
+        except ValueError:
+            continue
+        start = time.perf_counter()
+        stats = generator.calc_elevation_stats(meta["segments"], meta["cumulative_km"])
+        fixture_s = time.perf_counter() - start
+        start = time.perf_counter()
+        for route in catalog:
+            generator.calc_elevation_stats(route["segments"], route["cumulative_km"])
+        catalog_s = time.perf_counter() - start
+        methods.append({
+            "smoothing": smoothing,
+            "window": window,
+            "climb": climb,
+            "wall_s": round(fixture_s, 4),
+            "climb_m": stats.get("climb_m"),
+            "error_pct": round((stats["climb_m"] - truth) / truth * 100, 1) if stats and truth else None,
+            "catalog_s": round(catalog_s, 4),
+            "catalog_routes": len(catalog),
+        })
+    route_elevation.configure(route_elevation.DEFAULT_SMOOTHING, route_elevation.DEFAULT_CLIMB)
+    return methods
+
+
+def run_case(name: str, fixture_dir: Path, vertices: int, jobs: int, windows=(None,)) -> dict:
+    """Один замер в текущем процессе. Подготовка в время не входит."""
+    generator = index_generator.load()
+    kml = fixture_dir / "route.kml"
+
+    if name == "parse_coordinates":
+        text = fixtures.coordinates_text(vertices)
+        start = time.perf_counter()
+        generator.parse_coordinates(text)
+    elif name == "parse_coordinates_array":
+        if generator.np is None:
+            return {"benchmark": name, "vertices": vertices, "skipped": "NumPy не установлен"}
+        text = fixtures.coordinates_text(vertices)
+        start = time.perf_counter()
+        generator.parse_coordinates_array(text)
+    elif name == "parse_kml":
+        start = time.perf_counter()
+        with open(kml, "rb") as f:
+            generator.parse_kml(f)
+    elif name == "calc_elevation_stats":
+        with open(kml, "rb") as f:
+            segments = generator.parse_kml(f)["segments"]
+        start = time.perf_counter()
+        generator.calc_elevation_stats(segments)
+    elif name in ("simplify", "simplify_python"):
+        with open(kml, "rb") as f:
+            segments = generator.parse_kml(f)["segments"]
+        geometry = generator.route_geometry
+        if name == "simplify_python":
+            geometry.np = None
+        start = time.perf_counter()
+        # Как в build_route_record: трек карточки, из него — уровни превью
+        simplified = []
+        for seg in segments:
+            simplified.append([seg[i] for i in geometry.simplify_indices(seg, geometry.DETAIL_TOLERANCE_M)])
+        geometry.build_lods(simplified)
+    elif name == "elevation_methods":
+        methods = elevation_methods(generator, kml, vertices, windows)
+        wall = sum(m["wall_s"] for m in methods)
+        return {
+            "benchmark": name,
+            "vertices": vertices,
+            "wall_s": round(wall, 4),
+            "vertices_per_s": round(vertices * len(methods) / wall) if wall > 0 else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "methods": methods,
+        }
+    elif name == "load_route_file":
+        start = time.perf_counter()
+        generator.load_route_file(fixture_dir / "route.kmz")
+    elif name == "generate_index":
+        redirect_generator(generator, fixture_dir / "routes")
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator.generate_index(use_cache=False, jobs=jobs)
+    else:
+        raise ValueError(f"Неизвестный замер: {name}")
+
+    wall = time.perf_counter() - start
+    return {
+        "benchmark": name,
+        "vertices": vertices,
+        "wall_s": round(wall, 4),
+        "vertices_per_s": round(vertices / wall) if wall > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def prepare_fixtures(fixture_dir: Path, vertices: int):
+    fixtures.write_kml(fixture_dir / "route.kml", vertices)
+    fixtures.write_kmz(fixture_dir / "route.kmz", vertices)
+    fixtures.write_routes_tree(fixture_dir, vertices)
+
+
+def run_suite(sizes, benchmarks, repeat: int, jobs: int, windows=()) -> dict:
+    results = []
+    for vertices in sizes:
+        with tempfile.TemporaryDirectory(prefix="velotrek-bench-") as tmp:
+            fixture_dir = Path(tmp)
+            print(f"Фикстуры: {vertices} точек ...", file=sys.stderr, flush=True)
+            prepare_fixtures(fixture_dir, vertices)
+            for name in benchmarks:
+                runs = []
+                for _ in range(repeat):
+                    child = subprocess.run(
+                        [sys.executable, __file__, "--child", name, str(fixture_dir),
+                         str(vertices), "--jobs", str(jobs),
+                         "--elevation-windows", *(str(w) for w in windows)],
+                        capture_output=True, text=True, check=True,
+                    )
+                    runs.append(json.loads(child.stdout))
+                if "skipped" in runs[0]:
+                    results.append(runs[0])
+                    print(f"  {name:24s} пропущен: {runs[0]['skipped']}", file=sys.stderr, flush=True)
+                    continue
+                best = min(runs, key=lambda r: r["wall_s"])
+                best["runs"] = [r["wall_s"] for r in runs]
+                results.append(best)
+                print(f"  {name:24s} {best['wall_s']:9.3f} с  "
+                      f"{best['vertices_per_s'] or 0:>12,} точек/с  "
+                      f"RSS {best['peak_rss_mb']} МБ", file=sys.stderr, flush=True)
+                for m in best.get("methods", ()):
+                    error = "—" if m["error_pct"] is None else f"{m['error_pct']:+.1f}%"
+                    window = "" if m["window"] is None else f" ({m['window']:g})"
+                    print(f"    {m['smoothing'] + window + ' + ' + m['climb']:30s} {m['wall_s']:9.3f} с  "
+                          f"набор {m['climb_m']} м ({error})  "
+                          f"каталог {m['catalog_s']:.3f} с", file=sys.stderr, flush=True)
+
+    generator = index_generator.load()
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": generator.np.__version__ if generator.np is not None else None,
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="VeloTrek — бенчмарки генератора каталога")
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                            help="число точек трека в фикстурах")
+    arg_parser.add_argument("--bench", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS),
+                            help="какие замеры запускать")
+    arg_parser.add_argument("--repeat", type=int, default=1,
+                            help="повторов каждого замера (берётся лучший)")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=1,
+                            help="процессов для generate_index")
+    arg_parser.add_argument("--elevation-windows", type=float, nargs="*", default=[],
+                            help="ширины окна сглаживания для elevation_methods, кроме окна по умолчанию "
+                                 "(точек для points и savgol, метров для distance)")
+    arg_parser.add_argument("-o", "--output", help="записать JSON-отчёт в файл (по умолчанию — stdout)")
+    arg_parser.add_argument("--child", nargs=3, metavar=("BENCH", "DIR", "VERTICES"),
+                            help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.child:
+        name, fixture_dir, vertices = args.child
+        windows = (None, *args.elevation_windows)
+        print(json.dumps(run_case(name, Path(fixture_dir), int(vertices), args.jobs, windows)))
+        sys.exit(0)
+
+    report = run_suite(args.sizes, args.bench, args.repeat, args.jobs, args.elevation_windows)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
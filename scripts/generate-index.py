@@ -1,68 +1,181 @@
 #!/usr/bin/env python3
 """
 VeloTrek — генератор каталога маршрутов.
-Сканирует подпапки routes/, парсит KML/KMZ файлы, создаёт routes/index.json.
+Сканирует подпапки routes/, парсит KML/KMZ (а также GPX, TCX и GeoJSON),
+создаёт routes/index.json.
 Имя подпапки = название раздела каталога.
 
 Запуск локально:   python3 scripts/generate-index.py
 Запуск в Actions:  python3 scripts/generate-index.py
 """
 
+import argparse
+import bisect
+import gzip
+import hashlib
+import io
+import itertools
 import json
 import math
 import os
+import posixpath
 import re
 import sys
+import time
 import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 from xml.etree import ElementTree as ET
 
+import index_profile
+import offline_tiles
+import route_elevation
+import route_formats
+import route_geometry
+import route_overlap
+import spatial_index
+
+try:
+    import numpy as np
+except ImportError:  # NumPy не обязателен — без него работает чистый Python
+    np = None
+
+try:
+    import brotli
+except ImportError:  # без brotli пишутся только .gz-копии
+    brotli = None
+
+try:
+    import inotify_simple
+except ImportError:  # --watch без inotify опрашивает папку по таймеру
+    inotify_simple = None
+
 ROUTES_DIR = Path(__file__).parent.parent / "routes"
 OUTPUT_FILE = ROUTES_DIR / "index.json"
+CACHE_FILE = ROUTES_DIR / ".index-cache.json"
+GEOMETRY_FILE = ROUTES_DIR / "geometry.json"
+TILES_FILE = ROUTES_DIR / "tiles.json"
+CATALOG_FILE = ROUTES_DIR / "catalog.json"  # корневой манифест шардов
+SHARD_NAME = "index.json"  # шард раздела: routes/<раздел>/index.json
+DETAILS_DIR = ROUTES_DIR / "details"  # карточки маршрутов, имя = хэш содержимого
+SPATIAL_FILE = ROUTES_DIR / "spatial.json"  # R-дерево по трекам всех маршрутов
+OVERLAPS_FILE = ROUTES_DIR / "overlaps.json"  # общие участки пар маршрутов
 KML_NS = "http://www.opengis.net/kml/2.2"
+# Потоковые читатели форматов, кроме KML/KMZ (их разбирает parse_kml)
+ROUTE_READERS = {
+    ".gpx": route_formats.read_gpx,
+    ".tcx": route_formats.read_tcx,
+    ".geojson": route_formats.read_geojson,
+}
+PROFILE_STEP_M = 100  # шаг профиля высот в карточке маршрута, м
+
+
+def _segment_elevations(seg, cumulative_km=None):
+    """Ненулевые высоты точек сегмента и расстояния до них от начала, м.
+
+    Нулевая высота = нет данных, такие точки пропускаются. Без
+    cumulative_km расстояния не считаются (None).
+    """
+    if np is None:
+        idx = [i for i, pt in enumerate(seg) if len(pt) > 2 and pt[2]]
+        dist = [cumulative_km[i] * 1000 for i in idx] if cumulative_km is not None else None
+        return [seg[i][2] for i in idx], dist
+    pts = np.asarray(seg, dtype=np.float64)
+    if pts.ndim != 2 or pts.shape[1] < 3:
+        return np.empty(0), np.empty(0)
+    has_ele = pts[:, 2] != 0
+    dist = np.asarray(cumulative_km, dtype=np.float64)[has_ele] * 1000 if cumulative_km is not None else None
+    return pts[has_ele, 2], dist
+
+
+def elevation_profile(seg, cumulative_km, step_m: int = PROFILE_STEP_M) -> dict:
+    """Профиль высот сегмента через каждые step_m метров и его подъём/спуск.
+
+    Высоты сглаживаются так же, как в calc_elevation_stats, и линейно
+    интерполируются по накопленному расстоянию — профиль не зависит от
+    того, насколько неравномерно расставлены точки трека. Профиль хранится
+    разностями целых метров: первое число — высота в начале сегмента,
+    дальше — изменение на каждом шаге (для Int16Array на клиенте хватает
+    с запасом). Последняя точка профиля — конец сегмента: если длина не
+    кратна step_m, последний шаг неполный, его конец — profile_end_m. Без
+    данных о высоте возвращает {}.
+    """
+    eles, dist = _segment_elevations(seg, cumulative_km)
+    if len(eles) < 2:
+        return {}
 
+    smoothed = route_elevation.smooth(eles, dist)
+    climb, descent = route_elevation.climb_descent(smoothed)
+    length_m = float(cumulative_km[-1]) * 1000
 
-def calc_elevation_stats(segments: list) -> dict:
+    if np is not None:
+        grid = np.arange(0, length_m + 1e-9, step_m)
+        if length_m - grid[-1] > 1e-9:
+            grid = np.append(grid, length_m)
+        values = np.rint(np.interp(grid, dist, smoothed)).astype(np.int64).tolist()
+    else:
+        grid = [k * step_m for k in range(int(length_m // step_m) + 1)]
+        if length_m - grid[-1] > 1e-9:
+            grid.append(length_m)
+        values = []
+        for d in grid:
+            i = bisect.bisect_right(dist, d)
+            if i == 0:
+                v = smoothed[0]
+            elif i == len(dist):
+                v = smoothed[-1]
+            else:
+                d0, d1 = dist[i - 1], dist[i]
+                v = smoothed[i - 1] + (smoothed[i] - smoothed[i - 1]) * (d - d0) / (d1 - d0)
+            values.append(round(v))
+
+    values = [max(-32768, min(32767, v)) for v in values]
+    return {
+        "profile": values[:1] + [b - a for a, b in zip(values, values[1:])],
+        "profile_end_m": round(length_m),
+        "climb_m": round(climb),
+        "descent_m": round(descent),
+    }
+
+
+def calc_elevation_stats(segments: list, cumulative_km: list = None, *, window=None) -> dict:
     """Вычисляет статистику высот из координат треков.
 
-    Применяет скользящее среднее (окно 5 точек) перед суммированием
-    подъёмов/спусков. Точки треков расположены через ~200–300 м, окно
-    сглаживает суб-километровые артефакты SRTM-интерполяции, сохраняя
-    реальный рельеф.
+    Перед суммированием подъёмов/спусков высоты сглаживаются, способ
+    сглаживания и подсчёта задаёт route_elevation (по умолчанию —
+    скользящее среднее по 5 точкам: точки треков расположены через
+    ~200–300 м, окно сглаживает суб-километровые артефакты
+    SRTM-интерполяции, сохраняя реальный рельеф). cumulative_km —
+    накопленные расстояния сегментов, как в parse_kml; если не переданы,
+    а способу они нужны, считаются здесь. window — ширина окна
+    сглаживания вместо выбранной в route_elevation (для подбора окна).
     """
-    WINDOW = 5
     climb = 0.0
     descent = 0.0
     min_ele = float("inf")
     max_ele = float("-inf")
     has_ele = False
 
-    for seg in segments:
-        eles = [pt[2] for pt in seg if len(pt) > 2 and pt[2]]
+    for i, seg in enumerate(segments):
+        cumulative = cumulative_km[i] if cumulative_km is not None else None
+        if cumulative is None and route_elevation.needs_distance():
+            cumulative = segment_distances_km(seg)[1]
+        eles, dist = _segment_elevations(seg, cumulative)
         if len(eles) < 2:
             continue
         has_ele = True
-        for e in eles:
-            if e < min_ele:
-                min_ele = e
-            if e > max_ele:
-                max_ele = e
-
-        # Скользящее среднее
-        half = WINDOW // 2
-        smoothed = []
-        for i in range(len(eles)):
-            s = max(0, i - half)
-            e_idx = min(len(eles) - 1, i + half)
-            smoothed.append(sum(eles[s:e_idx + 1]) / (e_idx - s + 1))
-
-        for i in range(1, len(smoothed)):
-            diff = smoothed[i] - smoothed[i - 1]
-            if diff > 0:
-                climb += diff
-            else:
-                descent -= diff
+        if np is not None:
+            min_ele = min(min_ele, float(eles.min()))
+            max_ele = max(max_ele, float(eles.max()))
+        else:
+            min_ele = min(min_ele, min(eles))
+            max_ele = max(max_ele, max(eles))
+
+        seg_climb, seg_descent = route_elevation.climb_descent(route_elevation.smooth(eles, dist, window=window))
+        climb += seg_climb
+        descent += seg_descent
 
     if not has_ele:
         return {}
@@ -83,12 +196,42 @@ def haversine_km(lat1, lon1, lat2, lon2) -> float:
     return R * 2 * math.asin(math.sqrt(a))
 
 
+def segment_distances_km(points):
+    """Длины звеньев ломаной и накопленное расстояние вдоль неё, км.
+
+    points — список (lat, lon, ...) или массив NumPy (N, 3). Возвращает пару
+    (steps, cumulative): steps[i] — длина звена i → i+1, cumulative[i] —
+    путь от начала до точки i (cumulative[0] == 0). С NumPy все звенья
+    считаются одним векторным проходом, без него — через haversine_km.
+    Накопленный массив пригоден для профилей и разбивки по километрам.
+    """
+    if len(points) == 0:
+        return [], []
+
+    if np is None:
+        steps = [
+            haversine_km(points[i-1][0], points[i-1][1], points[i][0], points[i][1])
+            for i in range(1, len(points))
+        ]
+        return steps, [0.0] + list(itertools.accumulate(steps))
+
+    pts = np.asarray(points, dtype=np.float64)
+    lat, lon = pts[:, 0], pts[:, 1]
+    dlat = np.radians(np.diff(lat))
+    dlon = np.radians(np.diff(lon))
+    lat_rad = np.radians(lat)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat_rad[:-1]) * np.cos(lat_rad[1:]) * np.sin(dlon / 2) ** 2
+    steps = 6371.0 * 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    cumulative = np.empty(len(pts))
+    cumulative[0] = 0.0
+    np.cumsum(steps, out=cumulative[1:])
+    return steps, cumulative
+
+
 def segment_length_km(points: list) -> float:
     """Суммарная длина ломаной по списку (lat, lon) точек."""
-    total = 0.0
-    for i in range(1, len(points)):
-        total += haversine_km(points[i-1][0], points[i-1][1], points[i][0], points[i][1])
-    return total
+    _, cumulative = segment_distances_km(points)
+    return float(cumulative[-1]) if len(cumulative) else 0.0
 
 
 def bbox_span_km(bbox: dict) -> float:
@@ -115,40 +258,108 @@ def parse_coordinates(coords_text: str):
     return points
 
 
-def parse_kml(kml_text: str) -> dict:
-    """Парсит KML-текст и возвращает метаданные маршрута."""
-    ns = {"k": KML_NS}
+def _parse_coordinates_fast(coords_text: str):
+    """Быстрый путь parse_coordinates_array для регулярного блока координат.
 
+    Блок считается регулярным, если во всех триплетах одинаковое число
+    компонент (lon,lat или lon,lat,ele). Тогда весь блок разбирается одним
+    вызовом np.loadtxt — его C-парсер сам проверяет число колонок и не
+    принимает ничего, что отверг бы float(). Возвращает None для
+    нерегулярных блоков и битых значений — их обрабатывает медленный путь,
+    пропуская плохие триплеты.
+    """
+    triplets = coords_text.split()
+    if not triplets:
+        return np.empty((0, 3))
     try:
-        root = ET.fromstring(kml_text.encode("utf-8"))
-    except ET.ParseError as e:
-        raise ValueError(f"Ошибка парсинга KML: {e}")
+        values = np.loadtxt(triplets, delimiter=",", comments=None,
+                            dtype=np.float64, ndmin=2)
+    except ValueError:
+        return None
+    width = values.shape[1]
+    if width not in (2, 3):
+        return None
+
+    points = np.zeros((len(values), 3))
+    points[:, 0] = values[:, 1]
+    points[:, 1] = values[:, 0]
+    if width == 3:
+        points[:, 2] = values[:, 2]
+    return points
 
-    # Ищем Document (может быть в корне или вложен)
-    doc = root.find("k:Document", ns)
-    if doc is None:
-        doc = root  # Fallback
 
-    # Название и описание документа
-    name_el = doc.find("k:name", ns)
-    doc_name = name_el.text.strip() if name_el is not None and name_el.text else ""
+def parse_coordinates_array(coords_text: str):
+    """Как parse_coordinates, но возвращает массив NumPy формы (N, 3).
+
+    Требует NumPy. Регулярные блоки разбираются векторно, остальные —
+    через parse_coordinates, так что результат всегда совпадает.
+    """
+    points = _parse_coordinates_fast(coords_text)
+    if points is None:
+        points = np.array(parse_coordinates(coords_text), dtype=np.float64).reshape(-1, 3)
+    return points
 
-    desc_el = doc.find("k:description", ns)
-    doc_desc = desc_el.text.strip() if desc_el is not None and desc_el.text else ""
+
+def parse_kml(source) -> dict:
+    """Парсит KML и возвращает метаданные маршрута.
+
+    source — KML-текст (str/bytes) или бинарный файловый объект. Документ
+    читается потоково через ET.iterparse: каждый Placemark обрабатывается
+    по событию end и сразу удаляется из дерева, поэтому пиковая память не
+    растёт с размером трека. Ссылки NetworkLink/Link/href документа
+    попадают в meta["links"] — по ним load_route_file находит другие KML
+    внутри KMZ.
+    """
+    if isinstance(source, str):
+        source = io.BytesIO(source.encode("utf-8"))
+    elif isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    tag_document = f"{{{KML_NS}}}Document"
+    tag_placemark = f"{{{KML_NS}}}Placemark"
+    tag_name = f"{{{KML_NS}}}name"
+    tag_desc = f"{{{KML_NS}}}description"
+    tag_href = f"{{{KML_NS}}}href"
+    tag_link = f"{{{KML_NS}}}Link"
+    tag_network_link = f"{{{KML_NS}}}NetworkLink"
 
     pois = []
+    links = []  # href из NetworkLink, в порядке документа
     segments = []  # список сегментов: каждый — list of (lat, lon, ele)
-    track_km = 0.0
+    cumulative_km = []  # накопленное расстояние по точкам каждого сегмента
     bbox = {"minLat": 90, "maxLat": -90, "minLon": 180, "maxLon": -180}
 
+    # С NumPy координаты разбираются сразу в массив (N, 3)
+    parse_coords = parse_coordinates_array if np is not None else parse_coordinates
+
     def update_bbox(lat, lon):
         bbox["minLat"] = min(bbox["minLat"], lat)
         bbox["maxLat"] = max(bbox["maxLat"], lat)
         bbox["minLon"] = min(bbox["minLon"], lon)
         bbox["maxLon"] = max(bbox["maxLon"], lon)
 
-    # Все плейсмарки на любой глубине
-    for pm in root.iter(f"{{{KML_NS}}}Placemark"):
+    def update_bbox_points(pts):
+        if np is not None:
+            update_bbox(float(pts[:, 0].min()), float(pts[:, 1].min()))
+            update_bbox(float(pts[:, 0].max()), float(pts[:, 1].max()))
+        else:
+            for pt in pts:
+                update_bbox(pt[0], pt[1])
+
+    def add_line(ls):
+        coords_el = ls.find(f"{{{KML_NS}}}coordinates")
+        if coords_el is not None and coords_el.text:
+            with index_profile.stage("coordinates"):
+                pts = parse_coords(coords_el.text)
+            index_profile.count(len(pts))
+            if len(pts):
+                with index_profile.stage("distances"):
+                    _, cumulative = segment_distances_km(pts)
+                segments.append(pts)
+                cumulative_km.append(cumulative)
+                update_bbox_points(pts)
+
+    def handle_placemark(pm):
         point = pm.find(f"{{{KML_NS}}}Point")
         multi = pm.find(f"{{{KML_NS}}}MultiGeometry")
         line = pm.find(f"{{{KML_NS}}}LineString")
@@ -159,7 +370,7 @@ def parse_kml(kml_text: str) -> dict:
                 pts = parse_coordinates(coords_el.text)
                 if pts:
                     lat, lon = pts[0][0], pts[0][1]
-                    name_el = pm.find(f"{{{KML_NS}}}name")
+                    name_el = pm.find(tag_name)
                     pois.append({
                         "name": name_el.text.strip() if name_el is not None and name_el.text else "",
                         "lat": lat,
@@ -169,144 +380,866 @@ def parse_kml(kml_text: str) -> dict:
 
         elif multi is not None:
             for ls in multi.iter(f"{{{KML_NS}}}LineString"):
-                coords_el = ls.find(f"{{{KML_NS}}}coordinates")
-                if coords_el is not None and coords_el.text:
-                    pts = parse_coordinates(coords_el.text)
-                    if pts:
-                        segments.append(pts)
-                        track_km += segment_length_km(pts)
-                        for pt in pts:
-                            update_bbox(pt[0], pt[1])
+                add_line(ls)
 
         elif line is not None:
-            coords_el = line.find(f"{{{KML_NS}}}coordinates")
-            if coords_el is not None and coords_el.text:
-                pts = parse_coordinates(coords_el.text)
-                if pts:
-                    segments.append(pts)
-                    track_km += segment_length_km(pts)
-                    for pt in pts:
-                        update_bbox(pt[0], pt[1])
+            add_line(line)
+
+    # Название и описание берём из Document (прямой потомок корня),
+    # а если его нет — из самого корня
+    stack = []
+    root = doc = None
+    texts = {}  # (владелец, тег) -> текст первого такого потомка
+
+    try:
+        for event, elem in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                elif doc is None and len(stack) == 1 and elem.tag == tag_document:
+                    doc = elem
+                stack.append(elem)
+                continue
+
+            stack.pop()
+            if elem.tag == tag_placemark:
+                handle_placemark(elem)
+                # Выбрасываем обработанный плейсмарк из дерева
+                elem.clear()
+                if stack:
+                    stack[-1].remove(elem)
+            elif elem.tag in (tag_name, tag_desc) and stack:
+                parent = stack[-1]
+                owner = "doc" if parent is doc else "root" if parent is root else None
+                if owner and (owner, elem.tag) not in texts:
+                    texts[(owner, elem.tag)] = (elem.text or "").strip()
+            elif (elem.tag == tag_href and len(stack) >= 2 and stack[-1].tag == tag_link
+                  and stack[-2].tag == tag_network_link and elem.text and elem.text.strip()):
+                links.append(elem.text.strip())
+    except ET.ParseError as e:
+        raise ValueError(f"Ошибка парсинга KML: {e}")
+
+    owner = "doc" if doc is not None else "root"
+    doc_name = texts.get((owner, tag_name), "")
+    doc_desc = texts.get((owner, tag_desc), "")
 
     # Если bbox не обновился — нет координат
     if bbox["minLat"] == 90:
         bbox = None
 
-    # Все статистики из координат
-    stats = {}
-    stats["track_km"] = round(track_km, 1)
+    meta = route_meta(doc_name, plain_text(doc_desc), pois, segments, cumulative_km, bbox)
+    meta["links"] = links
+    return meta
+
+
+def plain_text(html: str) -> str:
+    """Описание без HTML-тегов и лишних пробелов."""
+    return re.sub(r"\s+", " ", re.sub(r"<[^>]+>", " ", html)).strip()
+
+
+def route_meta(name: str, description: str, pois: list, segments: list,
+               cumulative_km: list, bbox) -> dict:
+    """Метаданные маршрута из разобранных треков — общий итог всех форматов.
+
+    Статистика (длина трека, размах, высоты) считается только по
+    координатам, так что от формата файла не зависит.
+    """
+    stats = {"track_km": round(sum((float(c[-1]) for c in cumulative_km), 0.0), 1)}
     if bbox:
         stats["span_km"] = round(bbox_span_km(bbox), 1)
-    stats.update(calc_elevation_stats(segments))
+    with index_profile.stage("elevation"):
+        stats.update(calc_elevation_stats(segments, cumulative_km))
 
     return {
-        "name": doc_name,
-        "description": re.sub(r"\s+", " ", re.sub(r"<[^>]+>", " ", doc_desc)).strip(),
+        "name": name,
+        "description": description,
         "stats": stats,
         "pois": pois,
+        "segments": segments,
+        "cumulative_km": cumulative_km,
         "segmentCount": len(segments),
         "bbox": bbox,
     }
 
 
+def collect_route(items) -> dict:
+    """Метаданные маршрута из потокового читателя GPX, TCX или GeoJSON.
+
+    items — элементы ("name" | "description" | "segment" | "poi", значение)
+    из route_formats. Название и описание берутся первые непустые, куски
+    трека превращаются в те же сегменты, что и в parse_kml: с NumPy —
+    массив (N, 3) прямо поверх буфера читателя, без копии.
+    """
+    texts = {}
+    pois = []
+    segments = []
+    cumulative_km = []
+    lats = []
+    lons = []
+
+    for kind, value in items:
+        if kind == "segment":
+            with index_profile.stage("coordinates"):
+                if np is not None:
+                    pts = np.frombuffer(value, dtype=np.float64).reshape(-1, 3)
+                    lats += [float(pts[:, 0].min()), float(pts[:, 0].max())]
+                    lons += [float(pts[:, 1].min()), float(pts[:, 1].max())]
+                else:
+                    pts = list(zip(value[0::3], value[1::3], value[2::3]))
+                    lats += [min(value[0::3]), max(value[0::3])]
+                    lons += [min(value[1::3]), max(value[1::3])]
+            index_profile.count(len(pts))
+            with index_profile.stage("distances"):
+                _, cumulative = segment_distances_km(pts)
+            segments.append(pts)
+            cumulative_km.append(cumulative)
+        elif kind == "poi":
+            pois.append(value)
+            lats.append(value["lat"])
+            lons.append(value["lon"])
+        elif value and kind not in texts:
+            texts[kind] = value
+
+    bbox = {"minLat": min(lats), "maxLat": max(lats), "minLon": min(lons), "maxLon": max(lons)} if lats else None
+    return route_meta(texts.get("name", ""), plain_text(texts.get("description", "")),
+                      pois, segments, cumulative_km, bbox)
+
+
+def kmz_contents(z: zipfile.ZipFile) -> tuple:
+    """Содержимое KMZ без распаковки: (корневой KML, вложения).
+
+    Корневой документ — doc.kml, а если его нет, первый KML в порядке
+    архива (так же выбирает KMLParser.loadFromUrl на клиенте). Вложения
+    (картинки, иконки) перечисляются только по оглавлению архива:
+    [{"name", "bytes"}]. Остальные KML не вложения — они попадают в
+    маршрут, только если на них ссылается корневой документ.
+    """
+    kml_names = []
+    assets = []
+    for info in z.infolist():
+        if info.is_dir():
+            continue
+        if info.filename.lower().endswith(".kml"):
+            kml_names.append(info.filename)
+        else:
+            assets.append({"name": info.filename, "bytes": info.file_size})
+    root = "doc.kml" if "doc.kml" in kml_names else kml_names[0] if kml_names else None
+    return root, assets
+
+
+def kmz_link_target(z: zipfile.ZipFile, base: str, href: str):
+    """Имя KML внутри архива, на который ведёт href из документа base.
+
+    Относительные ссылки разрешаются от папки документа; внешние (URL,
+    абсолютные пути) и ссылки не на KML в архиве дают None.
+    """
+    if "://" in href or href.startswith("/"):
+        return None
+    name = posixpath.normpath(posixpath.join(posixpath.dirname(base), href.split("#")[0]))
+    if not name.lower().endswith(".kml") or name.startswith("../"):
+        return None
+    try:
+        z.getinfo(name)
+    except KeyError:
+        return None
+    return name
+
+
+def merge_routes(metas: list) -> dict:
+    """Объединяет разобранные KML одного KMZ в один маршрут.
+
+    Название и описание — из первого документа, где они есть; треки и
+    POI идут подряд, статистика считается заново по всем сегментам.
+    """
+    if len(metas) == 1:
+        return metas[0]
+    segments = [seg for meta in metas for seg in meta["segments"]]
+    boxes = [meta["bbox"] for meta in metas if meta["bbox"]]
+    bbox = {
+        "minLat": min(b["minLat"] for b in boxes),
+        "maxLat": max(b["maxLat"] for b in boxes),
+        "minLon": min(b["minLon"] for b in boxes),
+        "maxLon": max(b["maxLon"] for b in boxes),
+    } if boxes else None
+    return route_meta(
+        next((m["name"] for m in metas if m["name"]), ""),
+        next((m["description"] for m in metas if m["description"]), ""),
+        [poi for meta in metas for poi in meta["pois"]],
+        segments,
+        [c for meta in metas for c in meta["cumulative_km"]],
+        bbox,
+    )
+
+
 def load_route_file(filepath: Path) -> dict:
-    """Загружает KML или KMZ файл и возвращает метаданные."""
-    if filepath.suffix.lower() == ".kmz":
+    """Загружает файл маршрута (KML, KMZ, GPX, TCX, GeoJSON) и возвращает метаданные.
+
+    Формат определяется по расширению. KML из KMZ не распаковываются
+    целиком: каждый читается из архива потоком прямо в parse_kml, так что
+    память ограничена буфером распаковки и одним плейсмарком. KML, на
+    которые корневой документ KMZ ссылается через NetworkLink, объединяются
+    с ним в один маршрут, вложения попадают в meta["assets"]. GPX, TCX и
+    GeoJSON читаются потоково читателями route_formats (ROUTE_READERS) и
+    собираются collect_route.
+    """
+    suffix = filepath.suffix.lower()
+    reader = ROUTE_READERS.get(suffix)
+    if reader is not None:
+        with index_profile.stage(suffix.lstrip(".")), open(filepath, "rb") as f:
+            return collect_route(reader(f))
+
+    if suffix == ".kmz":
         try:
             with zipfile.ZipFile(filepath) as z:
-                # Ищем doc.kml или любой .kml внутри
-                kml_names = [n for n in z.namelist() if n.lower().endswith(".kml")]
-                if not kml_names:
+                with index_profile.stage("unzip"):
+                    root, assets = kmz_contents(z)
+                if root is None:
                     raise ValueError("В KMZ не найден KML-файл")
-                kml_name = "doc.kml" if "doc.kml" in kml_names else kml_names[0]
-                kml_text = z.read(kml_name).decode("utf-8")
+                # Обход ссылок NetworkLink от корневого документа: KML, на
+                # которые никто не ссылается (старые копии, резервные
+                # версии), в маршрут не попадают
+                metas = []
+                queue = [root]
+                seen = {root}
+                while queue:
+                    kml_name = queue.pop(0)
+                    with index_profile.stage("xml"), z.open(kml_name) as f:
+                        meta = parse_kml(f)
+                    metas.append(meta)
+                    for href in meta["links"]:
+                        target = kmz_link_target(z, kml_name, href)
+                        if target is not None and target not in seen:
+                            seen.add(target)
+                            queue.append(target)
         except zipfile.BadZipFile:
             raise ValueError("Файл повреждён или не является KMZ")
+        meta = merge_routes(metas)
+        meta["assets"] = assets
+        return meta
+
+    with index_profile.stage("xml"), open(filepath, "rb") as f:
+        return parse_kml(f)
+
+
+def build_route_detail(meta: dict, name: str, kept: list,
+                       precision: int = route_geometry.POLYLINE_PRECISION) -> dict:
+    """Карточка маршрута: всё, что нужно route.html без разбора KML.
+
+    kept — индексы точек каждого сегмента, оставшихся после упрощения.
+    Трек пишется в encoded polyline с precision знаками; для каждой точки
+    — накопленное расстояние от начала сегмента и высота, в целых метрах.
+    Для графика высот — профиль с шагом PROFILE_STEP_M и подъём/спуск
+    каждого сегмента (у многодневных маршрутов сегмент обычно
+    соответствует дню).
+    """
+    segments = []
+    for seg, cumulative, idx in zip(meta["segments"], meta["cumulative_km"], kept):
+        segments.append({
+            "line": route_geometry.encode_polyline([seg[i] for i in idx], precision),
+            "distance_m": [round(float(cumulative[i]) * 1000) for i in idx],
+            "elevation_m": [round(float(seg[i][2])) for i in idx],
+            **elevation_profile(seg, cumulative),
+        })
+    detail = {
+        "name": name,
+        "description": meta["description"],
+        "stats": meta["stats"],
+        "bbox": meta["bbox"],
+        "pois": meta["pois"],
+        "precision": precision,
+        "profile_step_m": PROFILE_STEP_M,
+        "segments": segments,
+    }
+    if meta.get("assets"):
+        detail["assets"] = meta["assets"]
+    return detail
+
+
+def build_route_record(section_name: str, filepath: Path,
+                       precision: int = route_geometry.POLYLINE_PRECISION) -> dict:
+    """Парсит файл маршрута и возвращает всё, что генератор из него строит.
+
+    record["entry"] — запись для index.json, record["lods"] — упрощённая
+    геометрия для geometry.json, record["spatial"] — элементы
+    пространственного индекса, record["tiles"] — манифест офлайн-тайлов
+    для tiles.json, record["detail"] — карточка маршрута для details/.
+    Геометрия кодируется в encoded polyline с precision знаками — так, как
+    её запишет генератор, поэтому запись из кэша пишется без
+    перекодирования. Ошибка парсинга не прерывает генерацию: возвращается
+    запись с полем error, чтобы файл всё равно попал в каталог.
+    """
+    try:
+        meta = load_route_file(filepath)
+    except Exception as e:
+        return {"entry": {
+            "filename": f"{section_name}/{filepath.name}",
+            "name": filepath.stem.replace("-", " ").replace("_", " "),
+            "description": "",
+            "stats": {},
+            "poiCount": 0,
+            "segmentCount": 0,
+            "bbox": None,
+            "error": str(e),
+        }}
+    entry = {
+        "filename": f"{section_name}/{filepath.name}",
+        "name": meta["name"] or filepath.stem.replace("-", " ").replace("_", " "),
+        "description": "",
+        "stats": meta["stats"],
+        "poiCount": len(meta["pois"]),
+        "segmentCount": meta["segmentCount"],
+        "bbox": meta["bbox"],
+    }
+    # Трек карточки упрощается один раз, уровни превью строятся уже из него
+    with index_profile.stage("simplify"):
+        kept = [
+            route_geometry.simplify_indices(seg, route_geometry.DETAIL_TOLERANCE_M)
+            for seg in meta["segments"]
+        ]
+        simplified = [[seg[i] for i in idx] for seg, idx in zip(meta["segments"], kept)]
+        lods = route_geometry.build_lods(simplified)
+    with index_profile.stage("spatial"):
+        spatial = spatial_index.route_entries(lods[spatial_index.SPATIAL_ZOOM])
+    with index_profile.stage("detail"):
+        detail = build_route_detail(meta, entry["name"], kept, precision)
+    record = {
+        "entry": entry,
+        "lods": route_geometry.encode_lods(lods, precision),
+        "spatial": spatial,
+        "detail": detail,
+    }
+    if meta["bbox"]:
+        with index_profile.stage("tiles"):
+            record["tiles"] = offline_tiles.route_manifest(meta["bbox"], meta["segments"])
+    return record
+
+
+def parser_version(precision: int = route_geometry.POLYLINE_PRECISION) -> str:
+    """Версия парсера — хэш исходников генератора, его модулей, способа подсчёта высот и точности.
+
+    Любая правка этих файлов меняет версию и сбрасывает кэш целиком; запуск
+    с другой --polyline-precision тоже начинает с пустого кэша.
+    """
+    h = hashlib.sha256()
+    for source in (__file__, route_geometry.__file__, offline_tiles.__file__, route_elevation.__file__,
+                   route_formats.__file__, spatial_index.__file__):
+        h.update(Path(source).read_bytes())
+    h.update(f"precision={precision}".encode())
+    # Выбранный способ подсчёта высот и окно сглаживания меняют статистику — кэш тоже сбрасывается
+    h.update(json.dumps(route_elevation.method(), sort_keys=True).encode())
+    return h.hexdigest()[:16]
+
+
+def overlaps_cache_key(tracks: dict) -> str:
+    """Ключ кэша общих участков: треки всех маршрутов, настройки и код поиска."""
+    return content_hash({
+        "source": hashlib.sha256(Path(route_overlap.__file__).read_bytes()).hexdigest(),
+        "cellM": route_overlap.CELL_M,
+        "minKm": route_overlap.MIN_OVERLAP_KM,
+        "tracks": tracks,
+    })
+
+
+def file_sha256(filepath: Path) -> str:
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_cache(version: str) -> dict:
+    """Читает кэш генератора; при смене версии парсера — пустой.
+
+    cache["files"] — разобранные маршруты, cache["overlaps"] — последний
+    результат поиска общих участков с ключом по трекам всех маршрутов.
+    """
+    try:
+        cache = json.loads(CACHE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != version:
+        return {}
+    return cache
+
+
+def save_cache(version: str, files: dict, overlaps: dict = None):
+    cache = {"version": version, "files": files}
+    if overlaps is not None:
+        cache["overlaps"] = overlaps
+    data = encode_json(cache)
+    try:
+        if CACHE_FILE.read_bytes() == data:
+            return
+    except OSError:
+        pass
+    write_atomic(CACHE_FILE, data)
+
+
+def encode_json(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_atomic(path: Path, data: bytes):
+    """Пишет файл через временный рядом с ним и os.replace.
+
+    Читатель (dev-сервер, service worker, следующий запуск) видит либо
+    старую, либо новую версию файла, но никогда — записанную наполовину.
+    """
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def write_artifact(path: Path, payload):
+    """Пишет payload минифицированным JSON и рядом сжатые копии .gz и .br.
+
+    Сжатие детерминированное (gzip без имени файла и с нулевым mtime,
+    brotli с фиксированными параметрами): одинаковый JSON даёт одинаковые
+    байты, и файлы не меняются в git без изменения содержимого. Если на
+    диске уже лежат те же байты со всеми копиями, ничего не пишется.
+    """
+    data = encode_json(payload)
+    write_artifact_data(path, data)
+    return data
+
+
+def write_artifact_data(path: Path, data: bytes):
+    """Пишет готовые байты JSON и сжатые копии, если на диске не они же.
+
+    Без модуля brotli копия .br удаляется: иначе клиенты, которые просят
+    br, получали бы старое содержимое.
+    """
+    if artifact_unchanged(path, data):
+        return
+    write_atomic(path, data)
+    write_atomic(Path(f"{path}.gz"), gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        write_atomic(Path(f"{path}.br"), brotli.compress(data, quality=11))
     else:
-        kml_text = filepath.read_text(encoding="utf-8")
+        Path(f"{path}.br").unlink(missing_ok=True)
+
+
+def artifact_unchanged(path: Path, data: bytes) -> bool:
+    """Лежит ли на диске ровно data вместе со сжатыми копиями того же содержимого.
+
+    Копии сверяются распаковкой: она быстрая, в отличие от сжатия. Без
+    модуля brotli копии .br быть не должно — проверить её нечем.
+    """
+    try:
+        if path.read_bytes() != data or gzip.decompress(Path(f"{path}.gz").read_bytes()) != data:
+            return False
+        br = Path(f"{path}.br")
+        if brotli is None:
+            return not br.exists()
+        return brotli.decompress(br.read_bytes()) == data
+    except (OSError, EOFError, zlib.error) + ((brotli.error,) if brotli is not None else ()):
+        return False  # копии нет или она испорчена
+
+
+def content_hash(payload) -> str:
+    return hashlib.sha256(encode_json(payload)).hexdigest()[:16]
+
+
+def write_index(sections: list) -> tuple:
+    """Пишет index.json, только если изменились разделы. Возвращает (hash, записан ли).
+
+    Поле hash — хэш содержимого sections: клиент и service worker могут
+    сравнить его с закэшированным, не сравнивая весь каталог. Отметка
+    generated обновляется только вместе с содержимым, поэтому запуск без
+    изменений в маршрутах не даёт диффа и лишнего коммита. Сжатые копии
+    при этом всё равно сверяются и, если их нет или они устарели,
+    пишутся заново из лежащего на диске index.json.
+    """
+    digest = content_hash(sections)
+    try:
+        previous_data = OUTPUT_FILE.read_bytes()
+        previous = json.loads(previous_data)
+    except (OSError, ValueError):
+        previous = None
+    if isinstance(previous, dict) and previous.get("hash") == digest:
+        write_artifact_data(OUTPUT_FILE, previous_data)
+        return digest, False
+    write_artifact(OUTPUT_FILE, {
+        "generated": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "hash": digest,
+        "sections": sections,
+    })
+    return digest, True
+
+
+def write_route_detail(detail: dict) -> str:
+    """Пишет карточку маршрута в details/<хэш>.json и возвращает путь от routes/.
+
+    Имя файла — хэш содержимого: изменённая карточка получает новое имя,
+    поэтому service worker может кэшировать карточки навсегда.
+    """
+    data = encode_json(detail)
+    name = f"{hashlib.sha256(data).hexdigest()[:16]}.json"
+    path = DETAILS_DIR / name
+    # Сверка с диском заодно дописывает потерянные .gz/.br рядом с карточкой
+    if not artifact_unchanged(path, data):
+        DETAILS_DIR.mkdir(exist_ok=True)
+        write_artifact(path, detail)
+    return f"{DETAILS_DIR.name}/{name}"
+
+
+def remove_stale_details(keep: set):
+    """Удаляет карточки, на которые больше не ссылается каталог."""
+    if not DETAILS_DIR.exists():
+        return
+    for path in DETAILS_DIR.iterdir():
+        if path.name.split(".")[0] + ".json" not in keep:
+            path.unlink()
+
+
+def remove_stale_shards(keep: set):
+    """Удаляет шарды разделов, которых больше нет в каталоге (все маршруты удалены)."""
+    for section_dir in ROUTES_DIR.iterdir():
+        if not section_dir.is_dir() or section_dir == DETAILS_DIR or section_dir.name in keep:
+            continue
+        for suffix in ("", ".gz", ".br"):
+            shard_path = section_dir / f"{SHARD_NAME}{suffix}"
+            if shard_path.exists():
+                shard_path.unlink()
 
-    return parse_kml(kml_text)
 
+def write_catalog_shards(sections: list) -> dict:
+    """Пишет по файлу-шарду на раздел и возвращает корневой манифест.
 
-def generate_index():
+    Шард routes/<раздел>/index.json содержит записи маршрутов одного
+    раздела. Манифест перечисляет разделы с числом маршрутов, путём и
+    хэшем содержимого шарда — клиент может скачать только открытый раздел
+    и перепроверять шарды независимо друг от друга.
+    Хэш всего манифеста совпадает с полем hash в index.json.
+    """
+    manifest = []
+    for section in sections:
+        shard_path = ROUTES_DIR / section["name"] / SHARD_NAME
+        data = write_artifact(shard_path, section)
+        manifest.append({
+            "name": section["name"],
+            "routeCount": len(section["routes"]),
+            "shard": f"{section['name']}/{SHARD_NAME}",
+            "hash": hashlib.sha256(data).hexdigest()[:16],
+            "bytes": len(data),
+        })
+    return {"hash": content_hash(sections), "sections": manifest}
+
+
+def generate_index(use_cache: bool = True, jobs: int = 0,
+                   precision: int = route_geometry.POLYLINE_PRECISION,
+                   embed_previews: bool = False):
+    """Строит routes/index.json и routes/geometry.json.
+
+    jobs — число процессов для парсинга (0 — по числу ядер, 1 — без пула).
+    Файлы раздаются пулу целиком, а результаты собираются и печатаются в
+    исходном отсортированном порядке, так что вывод и каталог не зависят
+    от числа процессов.
+
+    Геометрия пишется в encoded polyline с precision знаками. При
+    embed_previews самый грубый уровень детализации дополнительно
+    встраивается в запись маршрута в index.json (поле preview).
+    """
     if not ROUTES_DIR.exists():
         print(f"Папка {ROUTES_DIR} не найдена", file=sys.stderr)
         sys.exit(1)
 
+    # Кэш: путь файла -> размер, SHA-256 и всё, что из файла построено.
+    # Неизменённые файлы не перепарсиваются.
+    version = parser_version(precision)
+    cache = load_cache(version) if use_cache else {}
+    cached_files = cache.get("files", {})
+    new_cache = {}
+
     # Сканируем подпапки — каждая папка = раздел каталога
     section_dirs = sorted([
         d for d in ROUTES_DIR.iterdir()
-        if d.is_dir()
+        if d.is_dir() and d != DETAILS_DIR
     ])
 
-    if not section_dirs:
-        print("Подпапки с маршрутами не найдены в routes/")
-        sections = []
-    else:
-        sections = []
+    plan = []  # (раздел, [(файл, ключ кэша, размер, sha256, результат из кэша)])
+    with index_profile.stage("scan"):
         for section_dir in section_dirs:
-            section_name = section_dir.name
             route_files = sorted([
                 f for f in section_dir.iterdir()
-                if f.is_file() and f.suffix.lower() in (".kml", ".kmz")
+                if f.is_file() and f.suffix.lower() in route_formats.ROUTE_SUFFIXES
             ])
             if not route_files:
                 continue
+            files = []
+            for filepath in route_files:
+                key = f"{section_dir.name}/{filepath.name}"
+                size = filepath.stat().st_size
+                digest = file_sha256(filepath)
+                cached = cached_files.get(key)
+                hit = cached and cached["size"] == size and cached["sha256"] == digest
+                files.append((filepath, key, size, digest, cached["record"] if hit else None))
+            plan.append((section_dir.name, files))
+
+    to_parse = [
+        (section_name, filepath)
+        for section_name, files in plan
+        for filepath, _, _, _, record in files
+        if record is None
+    ]
+    jobs = jobs or os.cpu_count() or 1
+    pool = None
+    futures = {}
+    if jobs > 1 and len(to_parse) > 1:
+        # Способ подсчёта высот — настройка процесса, передаём её в процессы пула
+        elevation = route_elevation.method()
+        pool = ProcessPoolExecutor(max_workers=min(jobs, len(to_parse)),
+                                   initializer=route_elevation.configure,
+                                   initargs=(elevation["smoothing"], elevation["climb"], elevation["window"]))
+        futures = {
+            filepath: pool.submit(build_route_record, section_name, filepath, precision)
+            for section_name, filepath in to_parse
+        }
 
+    if not section_dirs:
+        print("Подпапки с маршрутами не найдены в routes/")
+    sections = []
+    geometry = {}
+    spatial = {}  # ключ -> элементы пространственного индекса маршрута
+    tracks = {}  # ключ -> детальный уровень превью (encoded polyline) для поиска общих участков
+    tiles = {}
+    details = set()
+    try:
+        for section_name, files in plan:
             print(f"\n[{section_name}]")
             routes = []
-            for filepath in route_files:
-                print(f"  Обработка: {filepath.name} ...", end=" ")
-                try:
-                    meta = load_route_file(filepath)
-                    route_entry = {
-                        "filename": f"{section_name}/{filepath.name}",
-                        "name": meta["name"] or filepath.stem.replace("-", " ").replace("_", " "),
-                        "description": "",
-                        "stats": meta["stats"],
-                        "poiCount": len(meta["pois"]),
-                        "segmentCount": meta["segmentCount"],
-                        "bbox": meta["bbox"],
-                    }
-                    routes.append(route_entry)
-                    track = meta["stats"].get("track_km", "?")
-                    span = meta["stats"].get("span_km", "?")
-                    poi = len(meta["pois"])
-                    print(f"OK (трек {track} км, размах {span} км, {poi} POI)")
-                except Exception as e:
-                    print(f"ОШИБКА: {e}", file=sys.stderr)
-                    # Добавляем запись с ошибкой, чтобы файл всё равно попал в каталог
-                    routes.append({
-                        "filename": f"{section_name}/{filepath.name}",
-                        "name": filepath.stem.replace("-", " ").replace("_", " "),
-                        "description": "",
-                        "stats": {},
-                        "poiCount": 0,
-                        "segmentCount": 0,
-                        "bbox": None,
-                        "error": str(e),
-                    })
+            for filepath, key, size, digest, record in files:
+                print(f"  Обработка: {filepath.name} ...", end=" ", flush=True)
+                from_cache = record is not None
+                if filepath in futures:
+                    record = futures[filepath].result()
+                elif not from_cache:
+                    with index_profile.file(key):
+                        record = build_route_record(section_name, filepath, precision)
+                new_cache[key] = {"size": size, "sha256": digest, "record": record}
+                route_entry = record["entry"]
+                if "lods" in record:
+                    geometry[key] = record["lods"]
+                    spatial[key] = record["spatial"]
+                    tracks[key] = record["lods"][route_overlap.OVERLAP_ZOOM]
+                    if embed_previews:
+                        coarsest = min(geometry[key], key=int)
+                        route_entry = dict(route_entry, preview=geometry[key][coarsest])
+                if "tiles" in record:
+                    tiles[key] = record["tiles"]
+                if "detail" in record:
+                    with index_profile.stage("write"):
+                        detail_path = write_route_detail(record["detail"])
+                    details.add(Path(detail_path).name)
+                    route_entry = dict(route_entry, detail=detail_path)
+                routes.append(route_entry)
+
+                if "error" in route_entry:
+                    print(f"ОШИБКА: {route_entry['error']}", file=sys.stderr)
+                    continue
+                track = route_entry["stats"].get("track_km", "?")
+                span = route_entry["stats"].get("span_km", "?")
+                poi = route_entry["poiCount"]
+                note = "кэш, " if from_cache else ""
+                print(f"OK ({note}трек {track} км, размах {span} км, {poi} POI)")
 
             sections.append({
                 "name": section_name,
                 "routes": routes,
             })
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
 
     total_routes = sum(len(s["routes"]) for s in sections)
-    index = {
-        "generated": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
-        "sections": sections,
-    }
 
-    OUTPUT_FILE.write_text(
-        json.dumps(index, ensure_ascii=False, indent=2),
-        encoding="utf-8"
-    )
-    print(f"\nГотово: {OUTPUT_FILE}")
+    with index_profile.stage("write"):
+        index_hash, index_written = write_index(sections)
+        write_artifact(CATALOG_FILE, write_catalog_shards(sections))
+        remove_stale_shards({section["name"] for section in sections})
+        # Упрощённая геометрия — отдельным компактным файлом, чтобы каталог
+        # мог рисовать превью маршрутов, не скачивая KML
+        write_artifact(GEOMETRY_FILE, {
+            "format": "polyline",
+            "precision": precision,
+            "tolerances_m": {str(z): t for z, t in route_geometry.LOD_TOLERANCES_M.items()},
+            "routes": geometry,
+        })
+        # Манифесты офлайн-тайлов (z10–z16) — клиенту не нужно пересчитывать
+        # набор тайлов по всему треку при открытии маршрута
+        write_artifact(TILES_FILE, {
+            "zoomMin": offline_tiles.ZOOM_MIN,
+            "zoomMax": offline_tiles.ZOOM_MAX,
+            "routes": tiles,
+        })
+        # Пространственный индекс — «маршруты рядом», поиск по видимой области
+        write_artifact(SPATIAL_FILE, spatial_index.SpatialIndex.from_entries(spatial).to_dict())
+    # Общие участки — для подсказок «объедините маршруты» и общих
+    # офлайн-тайлов при скачивании нескольких маршрутов
+    # Поиск идёт по всему каталогу, поэтому результат кэшируется целиком:
+    # пока треки всех маршрутов те же, он не пересчитывается
+    with index_profile.stage("overlaps"):
+        overlaps_key = overlaps_cache_key(tracks)
+        cached_overlaps = cache.get("overlaps") or {}
+        if cached_overlaps.get("key") == overlaps_key:
+            overlaps = cached_overlaps["pairs"]
+        else:
+            overlaps = route_overlap.find_overlaps({
+                key: [route_geometry.decode_polyline(line, precision) for line in lines]
+                for key, lines in tracks.items()
+            })
+    with index_profile.stage("write"):
+        write_artifact(OVERLAPS_FILE, {
+            "cellM": route_overlap.CELL_M,
+            "minKm": route_overlap.MIN_OVERLAP_KM,
+            "pairs": overlaps,
+        })
+        remove_stale_details(details)
+    with index_profile.stage("cache"):
+        save_cache(version, new_cache, {"key": overlaps_key, "pairs": overlaps})
+    print(f"\nГотово: {OUTPUT_FILE}, {CATALOG_FILE.name} (+{len(sections)} шардов), "
+          f"{GEOMETRY_FILE.name}, {TILES_FILE.name}, {SPATIAL_FILE.name}, {OVERLAPS_FILE.name}")
+    print(f"Хэш каталога: {index_hash}" + ("" if index_written else " (без изменений, index.json не перезаписан)"))
     print(f"Разделов: {len(sections)}, маршрутов всего: {total_routes}")
 
 
+def route_files_snapshot() -> dict:
+    """Путь -> (mtime_ns, размер) всех файлов маршрутов в разделах routes/."""
+    snapshot = {}
+    for filepath in ROUTES_DIR.glob("*/*"):
+        if filepath.suffix.lower() in route_formats.ROUTE_SUFFIXES and filepath.is_file():
+            st = filepath.stat()
+            snapshot[filepath] = (st.st_mtime_ns, st.st_size)
+    return snapshot
+
+
+def _change_waiter(interval: float):
+    """Функция ожидания изменений в routes/: inotify, если доступен, иначе опрос.
+
+    inotify только будит цикл раньше — что именно изменилось, всё равно
+    определяется сравнением снимков, поэтому оба способа ведут себя одинаково.
+    """
+    if inotify_simple is None:
+        return lambda: time.sleep(interval)
+
+    inotify = inotify_simple.INotify()
+    mask = (inotify_simple.flags.CLOSE_WRITE | inotify_simple.flags.MOVED_TO |
+            inotify_simple.flags.MOVED_FROM | inotify_simple.flags.DELETE |
+            inotify_simple.flags.CREATE)
+    watched = set()
+
+    def wait():
+        for d in [ROUTES_DIR] + [d for d in ROUTES_DIR.iterdir() if d.is_dir() and d != DETAILS_DIR]:
+            if d not in watched:
+                inotify.add_watch(d, mask)
+                watched.add(d)
+        inotify.read(timeout=int(interval * 1000))
+    return wait
+
+
+def watch(interval: float = 1.0, debounce: float = 0.5, **options):
+    """Следит за routes/ и пересобирает каталог после изменений маршрутов.
+
+    Серия изменений (копирование нескольких файлов, сохранение редактором)
+    склеивается: пересборка начинается, когда снимок файлов не меняется
+    debounce секунд. Благодаря кэшу перепарсиваются только изменённые
+    файлы, а каталог пишется атомарно — dev-сервер не отдаст его наполовину.
+    """
+    wait = _change_waiter(interval)
+    generate_index(**options)
+    # Первая сборка может быть с --no-cache, дальше кэш нужен обязательно
+    options["use_cache"] = True
+    last = route_files_snapshot()
+    print(f"\nСлежу за {ROUTES_DIR} ({'inotify' if inotify_simple else f'опрос раз в {interval} с'}), "
+          "Ctrl+C — выход")
+    try:
+        while True:
+            wait()
+            current = route_files_snapshot()
+            if current == last:
+                continue
+            while True:
+                time.sleep(debounce)
+                settled = route_files_snapshot()
+                if settled == current:
+                    break
+                current = settled
+
+            changed = sorted(
+                p.relative_to(ROUTES_DIR).as_posix()
+                for p in set(current) | set(last)
+                if current.get(p) != last.get(p)
+            )
+            print(f"\nИзменения: {', '.join(changed)}")
+            generate_index(**options)
+            last = current
+    except KeyboardInterrupt:
+        print("\nОстановлено")
+
+
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="VeloTrek — генерация каталога маршрутов")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="игнорировать кэш и перепарсить все файлы")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=0,
+                            help="число процессов для парсинга (по умолчанию — по числу ядер)")
+    arg_parser.add_argument("--polyline-precision", type=int, choices=(5, 6),
+                            default=route_geometry.POLYLINE_PRECISION,
+                            help="знаков после запятой в encoded polyline (5 — ~1 м, 6 — ~10 см)")
+    arg_parser.add_argument("--embed-previews", action="store_true",
+                            help="встроить грубое превью трека в записи index.json")
+    arg_parser.add_argument("--smoothing", choices=route_elevation.SMOOTHING,
+                            default=route_elevation.DEFAULT_SMOOTHING,
+                            help="сглаживание высот: по точкам, по расстоянию, Савицкого–Голея или без него")
+    arg_parser.add_argument("--elevation-window", type=float, default=None,
+                            help="окно сглаживания высот: точек для points и savgol, метров для distance "
+                                 "(по умолчанию — 5 точек, 500 м, 7 точек)")
+    arg_parser.add_argument("--climb", choices=route_elevation.CLIMB, default=route_elevation.DEFAULT_CLIMB,
+                            help="подсчёт набора высоты: сумма всех приращений или с порогом (гистерезис)")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="замерить время и память по стадиям и файлам (парсинг — в одном процессе)")
+    arg_parser.add_argument("--profile-report", action="store_true",
+                            help="как --profile, плюс routes/profile.json и routes/profile.pstats (cProfile)")
+    arg_parser.add_argument("--watch", action="store_true",
+                            help="следить за routes/ и пересобирать каталог после изменений")
+    arg_parser.add_argument("--watch-interval", type=float, default=1.0,
+                            help="период опроса routes/ в режиме --watch, с")
+    args = arg_parser.parse_args()
+
     print("VeloTrek — генерация каталога маршрутов")
     print("=" * 40)
-    generate_index()
+    try:
+        route_elevation.configure(args.smoothing, args.climb, args.elevation_window)
+    except ValueError as e:
+        arg_parser.error(str(e))
+    options = dict(use_cache=not args.no_cache, jobs=args.jobs,
+                   precision=args.polyline_precision, embed_previews=args.embed_previews)
+    if args.watch:
+        watch(interval=args.watch_interval, **options)
+        sys.exit(0)
+    if not (args.profile or args.profile_report):
+        generate_index(**options)
+        sys.exit(0)
+
+    # Профиль снимается в одном процессе: иначе tracemalloc и cProfile
+    # не увидят работу процессов пула
+    import cProfile
+    options["jobs"] = 1
+    profiler = cProfile.Profile() if args.profile_report else None
+    index_profile.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        generate_index(**options)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        profile = index_profile.stop()
+    profile.print_summary()
+    if args.profile_report:
+        report_file = ROUTES_DIR / "profile.json"
+        report_file.write_text(json.dumps(profile.report(), ensure_ascii=False, indent=2) + "\n",
+                               encoding="utf-8")
+        profiler.dump_stats(ROUTES_DIR / "profile.pstats")
+        print(f"\nОтчёт: {report_file}, {ROUTES_DIR / 'profile.pstats'}")
@@ -0,0 +1,24 @@
+"""
+VeloTrek — доступ к scripts/generate-index.py из других скриптов.
+
+Имя файла генератора содержит дефис, поэтому обычный import не работает;
+load() загружает его как модуль generate_index (один раз на процесс).
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).parent
+
+
+def load():
+    """Возвращает модуль генератора каталога."""
+    if "generate_index" not in sys.modules:
+        if str(SCRIPTS_DIR) not in sys.path:
+            sys.path.insert(0, str(SCRIPTS_DIR))
+        spec = importlib.util.spec_from_file_location("generate_index", SCRIPTS_DIR / "generate-index.py")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["generate_index"] = module
+        spec.loader.exec_module(module)
+    return sys.modules["generate_index"]
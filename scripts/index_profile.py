@@ -0,0 +1,139 @@
+"""
+VeloTrek — замеры стадий генератора каталога (режим --profile).
+
+Генератор оборачивает стадии в stage("имя"); пока профиль не включён
+через start(), это пустой контекст без накладных расходов. Время стадий
+считается исключительным: вложенная стадия (например, разбор координат
+внутри XML) вычитается из родительской, так что сумма по стадиям равна
+общему времени. Для каждого файла дополнительно пишутся время, число
+точек и пик памяти по tracemalloc.
+"""
+
+import contextlib
+import time
+import tracemalloc
+
+_NULL = contextlib.nullcontext()
+_active = None
+
+
+def _traced_peak_mb() -> float:
+    return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.wall_s = 0.0
+        self.stages = {}  # стадия -> секунды (исключительно)
+        self.files = []
+        self.vertices = 0
+        self.peak_mb = 0.0  # общий пик: tracemalloc сбрасывает пик на каждом файле
+        self._stack = []  # [имя, начало, время вложенных стадий]
+        self._file = None
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        frame = [name, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            own = elapsed - frame[2]
+            if self._stack:
+                self._stack[-1][2] += elapsed
+            self.stages[name] = self.stages.get(name, 0.0) + own
+            if self._file is not None:
+                self._file["stages"][name] = self._file["stages"].get(name, 0.0) + own
+
+    @contextlib.contextmanager
+    def file(self, key: str):
+        """Замер одного файла маршрута: время, точки, стадии, пик памяти."""
+        current = {"file": key, "vertices": 0, "stages": {}}
+        self._file = current
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            current["wall_s"] = time.perf_counter() - start
+            current["peak_mb"] = _traced_peak_mb()
+            self.peak_mb = max(self.peak_mb, current["peak_mb"])
+            self._file = None
+            self.files.append(current)
+
+    def count(self, vertices: int):
+        self.vertices += vertices
+        if self._file is not None:
+            self._file["vertices"] += vertices
+
+    def report(self) -> dict:
+        """Машиночитаемый отчёт (для profile.json)."""
+        return {
+            "wall_s": round(self.wall_s, 4),
+            "vertices": self.vertices,
+            "peak_mb": round(self.peak_mb, 1),
+            "stages": {name: round(s, 4) for name, s in sorted(self.stages.items(), key=lambda kv: -kv[1])},
+            "files": [
+                {
+                    "file": f["file"],
+                    "wall_s": round(f["wall_s"], 4),
+                    "vertices": f["vertices"],
+                    "vertices_per_s": round(f["vertices"] / f["wall_s"]) if f["wall_s"] > 0 else None,
+                    "peak_mb": round(f["peak_mb"], 1),
+                    "stages": {name: round(s, 4) for name, s in f["stages"].items()},
+                }
+                for f in self.files
+            ],
+        }
+
+    def print_summary(self, top: int = 10):
+        total = self.wall_s or 1e-9
+        print("\nПрофиль генерации")
+        print("-" * 40)
+        print(f"  {'стадия':<14}{'время, с':>10}{'доля':>8}")
+        for name, seconds in sorted(self.stages.items(), key=lambda kv: -kv[1]):
+            print(f"  {name:<14}{seconds:>10.3f}{seconds / total:>8.0%}")
+        print(f"  {'всего':<14}{self.wall_s:>10.3f}")
+        print(f"  пик памяти: {self.peak_mb:.1f} МБ (tracemalloc)")
+
+        if not self.files:
+            return
+        print(f"\n  Самые медленные файлы (из {len(self.files)} разобранных):")
+        print(f"  {'файл':<48}{'время, с':>10}{'точек':>9}{'точек/с':>11}{'пик, МБ':>9}")
+        for f in sorted(self.files, key=lambda f: -f["wall_s"])[:top]:
+            rate = f["vertices"] / f["wall_s"] if f["wall_s"] > 0 else 0
+            print(f"  {f['file'][-48:]:<48}{f['wall_s']:>10.3f}{f['vertices']:>9}{rate:>11.0f}{f['peak_mb']:>9.1f}")
+
+
+def start() -> Profile:
+    """Включает профиль для текущего процесса и запускает tracemalloc."""
+    global _active
+    _active = Profile()
+    tracemalloc.start()
+    return _active
+
+
+def stop() -> Profile:
+    """Выключает профиль и tracemalloc, возвращает собранные замеры."""
+    global _active
+    profile, _active = _active, None
+    profile.wall_s = time.perf_counter() - profile.started
+    profile.peak_mb = max(profile.peak_mb, _traced_peak_mb())
+    tracemalloc.stop()
+    return profile
+
+
+def stage(name: str):
+    return _active.stage(name) if _active is not None else _NULL
+
+
+def file(key: str):
+    return _active.file(key) if _active is not None else _NULL
+
+
+def count(vertices: int):
+    if _active is not None:
+        _active.count(vertices)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+VeloTrek — расчёт офлайн-тайлов маршрута на стороне генератора.
+
+Порт OfflineTiles.getTilesForRoute из js/offline.js: на зумах до 13 —
+весь bounding box с запасом 0.01°, на 14–16 — коридор 3×3 тайла вокруг
+каждой N-й точки трека и последней точки сегмента. Результат сжимается в
+манифест (число тайлов по зумам и отрезки x по строкам y), чтобы клиент
+не пересчитывал набор тайлов на телефоне.
+
+Проверка совпадения с JS-версией (нужен node):
+    python3 scripts/offline_tiles.py --verify
+"""
+
+import argparse
+import json
+import math
+import subprocess
+import sys
+from pathlib import Path
+
+import route_formats
+
+ZOOM_MIN = 10
+ZOOM_MAX = 16
+BBOX_ZOOM_MAX = 13  # до этого зума включительно берётся весь bbox
+BBOX_MARGIN_DEG = 0.01
+CORRIDOR_BUFFER = 1  # тайлов с каждой стороны от точки трека
+CORRIDOR_SAMPLES = 500  # ~столько точек сегмента проверяется на каждом зуме
+
+
+def lon2tile(lon: float, zoom: int) -> int:
+    return math.floor(((lon + 180) / 360) * 2 ** zoom)
+
+
+def lat2tile(lat: float, zoom: int) -> int:
+    lat_rad = (lat * math.pi) / 180
+    return math.floor(
+        ((1 - math.log(math.tan(lat_rad) + 1 / math.cos(lat_rad)) / math.pi) / 2) * 2 ** zoom
+    )
+
+
+def _bbox_range(bbox: dict, z: int) -> tuple:
+    """Тайлы bbox с запасом на зуме z: (x_min, x_max, y_min, y_max) включительно."""
+    return (
+        lon2tile(bbox["minLon"] - BBOX_MARGIN_DEG, z),
+        lon2tile(bbox["maxLon"] + BBOX_MARGIN_DEG, z),
+        lat2tile(bbox["maxLat"] + BBOX_MARGIN_DEG, z),
+        lat2tile(bbox["minLat"] - BBOX_MARGIN_DEG, z),
+    )
+
+
+def _corridor(segments, z: int):
+    """Тайлы (x, y) коридора вокруг точек трека на зуме z — в порядке обхода, как в JS.
+
+    Соседние точки трека обычно попадают в один тайл; повторный центр
+    ничего не добавляет (его соседи уже выданы при первом появлении),
+    поэтому пропускается — порядок первых появлений тайлов не меняется.
+    """
+    centers = set()
+    for segment in segments:
+        step = max(1, len(segment) // CORRIDOR_SAMPLES)
+        points = [segment[i] for i in range(0, len(segment), step)]
+        if len(segment) > 0:
+            points.append(segment[-1])
+        for p in points:
+            center = (lon2tile(float(p[1]), z), lat2tile(float(p[0]), z))
+            if center in centers:
+                continue
+            centers.add(center)
+            cx, cy = center
+            for dx in range(-CORRIDOR_BUFFER, CORRIDOR_BUFFER + 1):
+                for dy in range(-CORRIDOR_BUFFER, CORRIDOR_BUFFER + 1):
+                    yield cx + dx, cy + dy
+
+
+def tiles_for_route(bbox: dict, segments, zoom_min: int = ZOOM_MIN, zoom_max: int = ZOOM_MAX) -> list:
+    """Ключи тайлов "z/x/y" маршрута — в том же порядке, что и в JS.
+
+    Ключи нужны сверке с js/offline.js (--verify) и tile_planner;
+    генератор строит манифест сразу, без строковых ключей, через
+    route_manifest.
+    """
+    tiles = {}  # упорядоченное множество, как Set в JS
+
+    for z in range(zoom_min, min(BBOX_ZOOM_MAX, zoom_max) + 1):
+        x_min, x_max, y_min, y_max = _bbox_range(bbox, z)
+        for x in range(x_min, x_max + 1):
+            for y in range(y_min, y_max + 1):
+                tiles[f"{z}/{x}/{y}"] = None
+
+    for z in range(max(BBOX_ZOOM_MAX + 1, zoom_min), zoom_max + 1):
+        for x, y in _corridor(segments, z):
+            tiles[f"{z}/{x}/{y}"] = None
+
+    return list(tiles)
+
+
+def _zoom_rows(by_y: dict) -> dict:
+    """Манифест одного зума из {y: множество x}."""
+    rows = []
+    count = 0
+    for y in sorted(by_y):
+        xs = sorted(by_y[y])
+        count += len(xs)
+        runs = []
+        start = prev = xs[0]
+        for x in xs[1:]:
+            if x != prev + 1:
+                runs += [start, prev]
+                start = x
+            prev = x
+        runs += [start, prev]
+        if rows and rows[-1][1] == y - 1 and rows[-1][2:] == runs:
+            rows[-1][1] = y
+        else:
+            rows.append([y, y] + runs)
+    return {"count": count, "rows": rows}
+
+
+def _manifest(zooms: dict) -> dict:
+    return {
+        "count": sum(zoom["count"] for zoom in zooms.values()),
+        "zooms": zooms,
+    }
+
+
+def build_manifest(keys) -> dict:
+    """Сжимает ключи тайлов в манифест.
+
+    {"count": N, "zooms": {"<z>": {"count": n, "rows": [[y0, y1, x0, x1, ...]]}}}:
+    строка покрывает тайлы y0..y1 включительно, для каждого y — одни и те же
+    пары x0, x1 (включительные отрезки подряд идущих тайлов). Соседние y с
+    одинаковыми отрезками склеиваются, так что прямоугольник bbox на
+    низких зумах занимает одну строку.
+    """
+    by_zoom = {}
+    for key in keys:
+        z, x, y = map(int, key.split("/"))
+        by_zoom.setdefault(z, {}).setdefault(y, set()).add(x)
+    return _manifest({str(z): _zoom_rows(by_zoom[z]) for z in sorted(by_zoom)})
+
+
+def route_manifest(bbox: dict, segments, zoom_min: int = ZOOM_MIN, zoom_max: int = ZOOM_MAX) -> dict:
+    """Манифест тайлов маршрута — то же, что build_manifest(tiles_for_route(...)).
+
+    Зумы bbox дают одну строку прямо из диапазона тайлов, коридор
+    собирается в множества x по строкам y — строковые ключи не строятся.
+    """
+    zooms = {}
+    for z in range(zoom_min, zoom_max + 1):
+        if z <= BBOX_ZOOM_MAX:
+            x_min, x_max, y_min, y_max = _bbox_range(bbox, z)
+            if x_min <= x_max and y_min <= y_max:
+                zooms[str(z)] = {
+                    "count": (x_max - x_min + 1) * (y_max - y_min + 1),
+                    "rows": [[y_min, y_max, x_min, x_max]],
+                }
+            continue
+        by_y = {}
+        for x, y in _corridor(segments, z):
+            by_y.setdefault(y, set()).add(x)
+        if by_y:
+            zooms[str(z)] = _zoom_rows(by_y)
+    return _manifest(zooms)
+
+
+def manifest_keys(manifest: dict) -> list:
+    """Разворачивает манифест обратно в список ключей "z/x/y"."""
+    keys = []
+    for z, zoom in manifest["zooms"].items():
+        for row in zoom["rows"]:
+            for y in range(row[0], row[1] + 1):
+                for i in range(2, len(row), 2):
+                    keys.extend(f"{z}/{x}/{y}" for x in range(row[i], row[i + 1] + 1))
+    return keys
+
+
+_JS_HARNESS = """
+const fs = require("fs");
+const vm = require("vm");
+globalThis.idb = {};
+const tilesApi = vm.runInThisContext(fs.readFileSync(process.argv[1], "utf8") + ";OfflineTiles");
+const routes = JSON.parse(fs.readFileSync(0, "utf8"));
+const out = {};
+for (const [name, data] of Object.entries(routes)) {
+  out[name] = tilesApi.getTilesForRoute(data, %d, %d);
+}
+process.stdout.write(JSON.stringify(out));
+""" % (ZOOM_MIN, ZOOM_MAX)
+
+
+def verify(routes_dir: Path) -> bool:
+    """Сравнивает tiles_for_route с OfflineTiles.getTilesForRoute на всех маршрутах."""
+    import index_generator
+    generator = index_generator.load()
+
+    routes = {}
+    for filepath in sorted(routes_dir.glob("*/*")):
+        if filepath.suffix.lower() not in route_formats.ROUTE_SUFFIXES:
+            continue
+        meta = generator.load_route_file(filepath)
+        if meta["bbox"]:
+            routes[str(filepath.relative_to(routes_dir))] = {
+                "bbox": meta["bbox"],
+                "segments": [[[float(p[0]), float(p[1])] for p in seg] for seg in meta["segments"]],
+            }
+
+    js_file = Path(__file__).parent.parent / "js" / "offline.js"
+    result = subprocess.run(
+        ["node", "-e", _JS_HARNESS, str(js_file)],
+        input=json.dumps(routes), capture_output=True, text=True, check=True,
+    )
+    expected = json.loads(result.stdout)
+
+    ok = True
+    for name, data in routes.items():
+        keys = tiles_for_route(data["bbox"], data["segments"])
+        manifest = route_manifest(data["bbox"], data["segments"])
+        same = (keys == expected[name] and manifest == build_manifest(keys)
+                and sorted(manifest_keys(manifest)) == sorted(keys))
+        ok = ok and same
+        print(f"  {'OK' if same else 'РАСХОЖДЕНИЕ'}: {name} ({len(keys)} тайлов)")
+    return ok
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="VeloTrek — офлайн-тайлы маршрутов")
+    arg_parser.add_argument("--verify", action="store_true",
+                            help="сверить расчёт с OfflineTiles.getTilesForRoute из js/offline.js")
+    args = arg_parser.parse_args()
+    if not args.verify:
+        arg_parser.print_help()
+        sys.exit(2)
+    sys.exit(0 if verify(Path(__file__).parent.parent / "routes") else 1)
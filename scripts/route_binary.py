@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+VeloTrek — компактный бинарный формат маршрута (.vtrk).
+
+Альтернатива KML для клиента: файл читается через DataView и типизированные
+массивы без разбора XML. Все числа little-endian, каждая секция начинается
+с границы 4 байт, поэтому Int32Array/Int16Array/Uint32Array можно создавать
+прямо поверх ArrayBuffer без копирования.
+
+Раскладка:
+    заголовок, 32 байта:
+        magic "VTRK", u16 version, u16 flags (пока 0),
+        u32 segment_count, u32 point_count, u32 poi_count,
+        u32 strings_bytes, u32 reserved, u32 reserved
+    u32[segment_count]   — число точек в каждом сегменте
+    i32[point_count]     — широта, 1e-6°, разность с предыдущей точкой
+    i32[point_count]     — долгота, 1e-6°, разность с предыдущей точкой
+    i16[point_count]     — высота, целые метры (+ выравнивание до 4 байт)
+    i32[poi_count]       — широта POI, 1e-6°, абсолютная
+    i32[poi_count]       — долгота POI, 1e-6°, абсолютная
+    u32[poi_count + 2]   — смещения строк: [0] — название маршрута,
+                           [1..poi_count] — названия POI, последнее — конец
+    UTF-8 строки         — подряд, без разделителей (+ выравнивание)
+
+Разности идут сквозь все сегменты от нуля: клиент восстанавливает
+координаты одной накопленной суммой, а затем режет массив по длинам
+сегментов. Мелкие разности к тому же хорошо сжимаются gzip/brotli.
+
+Запись .vtrk рядом с исходными файлами (foo.kml -> foo.kml.vtrk: исходное
+расширение остаётся в имени, чтобы foo.kml и foo.gpx одного раздела не
+затирали друг друга) и проверка туда-обратно:
+    python3 scripts/route_binary.py [файлы...]
+    python3 scripts/route_binary.py --verify
+"""
+
+import argparse
+import gzip
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+import route_formats
+
+MAGIC = b"VTRK"
+VERSION = 1
+COORD_SCALE = 1_000_000  # 1e-6° — ~11 см по широте
+SUFFIX = ".vtrk"
+
+_HEADER = struct.Struct("<4sHHIIIIII")
+
+
+def _pack(typecode: str, values) -> bytes:
+    data = array(typecode, values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _unpack(typecode: str, buf: bytes, offset: int, count: int):
+    data = array(typecode)
+    data.frombytes(buf[offset:offset + count * data.itemsize])
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data, offset + count * data.itemsize
+
+
+def _pad4(data: bytes) -> bytes:
+    return data + b"\0" * (-len(data) % 4)
+
+
+def _clamp_i16(value: float) -> int:
+    return max(-32768, min(32767, round(value)))
+
+
+def encode_route(name: str, segments, pois) -> bytes:
+    """Кодирует маршрут (как его возвращает parse_kml) в байты .vtrk.
+
+    segments — сегменты из точек (lat, lon, ele), pois — [{"name", "lat", "lon"}].
+    """
+    lengths = []
+    lat_deltas, lon_deltas, elevations = [], [], []
+    prev_lat = prev_lon = 0
+    for seg in segments:
+        lengths.append(len(seg))
+        for p in seg:
+            lat = round(float(p[0]) * COORD_SCALE)
+            lon = round(float(p[1]) * COORD_SCALE)
+            lat_deltas.append(lat - prev_lat)
+            lon_deltas.append(lon - prev_lon)
+            elevations.append(_clamp_i16(float(p[2]) if len(p) > 2 else 0.0))
+            prev_lat, prev_lon = lat, lon
+
+    strings = [name.encode("utf-8")] + [poi["name"].encode("utf-8") for poi in pois]
+    offsets = [0]
+    for s in strings:
+        offsets.append(offsets[-1] + len(s))
+
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(lengths), len(lat_deltas), len(pois),
+                          offsets[-1], 0, 0)
+    return b"".join([
+        header,
+        _pack("I", lengths),
+        _pack("i", lat_deltas),
+        _pack("i", lon_deltas),
+        _pad4(_pack("h", elevations)),
+        _pack("i", [round(float(poi["lat"]) * COORD_SCALE) for poi in pois]),
+        _pack("i", [round(float(poi["lon"]) * COORD_SCALE) for poi in pois]),
+        _pack("I", offsets),
+        _pad4(b"".join(strings)),
+    ])
+
+
+def decode_route(buf: bytes) -> dict:
+    """Обратное к encode_route: {"name", "segments": [[[lat, lon, ele], ...]], "pois"}."""
+    if len(buf) < _HEADER.size:
+        raise ValueError("Файл слишком короткий для .vtrk")
+    magic, version, _flags, segment_count, point_count, poi_count, strings_bytes, _, _ = \
+        _HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise ValueError("Не .vtrk: неверная сигнатура")
+    if version != VERSION:
+        raise ValueError(f"Неподдерживаемая версия .vtrk: {version}")
+
+    offset = _HEADER.size
+    lengths, offset = _unpack("I", buf, offset, segment_count)
+    lat_deltas, offset = _unpack("i", buf, offset, point_count)
+    lon_deltas, offset = _unpack("i", buf, offset, point_count)
+    elevations, offset = _unpack("h", buf, offset, point_count)
+    offset += -offset % 4
+    poi_lats, offset = _unpack("i", buf, offset, poi_count)
+    poi_lons, offset = _unpack("i", buf, offset, poi_count)
+    string_offsets, offset = _unpack("I", buf, offset, poi_count + 2)
+    text = buf[offset:offset + strings_bytes]
+    if sum(lengths) != point_count or len(text) != strings_bytes:
+        raise ValueError("Файл .vtrk повреждён")
+
+    strings = [text[string_offsets[i]:string_offsets[i + 1]].decode("utf-8")
+               for i in range(poi_count + 1)]
+
+    segments = []
+    lat = lon = 0
+    i = 0
+    for length in lengths:
+        seg = []
+        for _ in range(length):
+            lat += lat_deltas[i]
+            lon += lon_deltas[i]
+            seg.append([lat / COORD_SCALE, lon / COORD_SCALE, elevations[i]])
+            i += 1
+        segments.append(seg)
+
+    pois = [
+        {"name": strings[k + 1], "lat": poi_lats[k] / COORD_SCALE, "lon": poi_lons[k] / COORD_SCALE}
+        for k in range(poi_count)
+    ]
+    return {"name": strings[0], "segments": segments, "pois": pois}
+
+
+def _same_route(meta: dict, decoded: dict) -> bool:
+    """Совпадает ли раскодированный маршрут с исходным с точностью формата."""
+    tol = 0.5 / COORD_SCALE + 1e-9
+    if decoded["name"] != meta["name"] or len(decoded["segments"]) != len(meta["segments"]):
+        return False
+    for seg, dec in zip(meta["segments"], decoded["segments"]):
+        if len(seg) != len(dec):
+            return False
+        for p, q in zip(seg, dec):
+            if abs(float(p[0]) - q[0]) > tol or abs(float(p[1]) - q[1]) > tol:
+                return False
+            if q[2] != _clamp_i16(float(p[2])):
+                return False
+    if len(decoded["pois"]) != len(meta["pois"]):
+        return False
+    return all(
+        a["name"] == b["name"] and abs(a["lat"] - b["lat"]) <= tol and abs(a["lon"] - b["lon"]) <= tol
+        for a, b in zip(meta["pois"], decoded["pois"])
+    )
+
+
+def vtrk_path(filepath: Path) -> Path:
+    """Путь .vtrk для файла маршрута: рядом с ним, с исходным расширением в имени."""
+    return filepath.with_name(filepath.name + SUFFIX)
+
+
+def _route_files(paths) -> list:
+    if paths:
+        return [Path(p) for p in paths]
+    routes_dir = Path(__file__).parent.parent / "routes"
+    return sorted(p for p in routes_dir.glob("*/*") if p.suffix.lower() in route_formats.ROUTE_SUFFIXES)
+
+
+def main(paths, verify: bool) -> bool:
+    import index_generator
+    generator = index_generator.load()
+
+    ok = True
+    for filepath in _route_files(paths):
+        meta = generator.load_route_file(filepath)
+        blob = encode_route(meta["name"], meta["segments"], meta["pois"])
+        sizes = (f"{filepath.stat().st_size // 1024} КБ -> {len(blob) // 1024} КБ, "
+                 f"gzip {len(gzip.compress(blob, mtime=0)) // 1024} КБ")
+        if verify:
+            same = _same_route(meta, decode_route(blob))
+            ok = ok and same
+            print(f"  {'OK' if same else 'РАСХОЖДЕНИЕ'}: {filepath.name} ({sizes})")
+        else:
+            target = vtrk_path(filepath)
+            target.write_bytes(blob)
+            print(f"  {target.name}: {sizes}")
+    return ok
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="VeloTrek — бинарный формат маршрутов .vtrk")
+    arg_parser.add_argument("files", nargs="*", help="KML/KMZ файлы (по умолчанию — все маршруты)")
+    arg_parser.add_argument("--verify", action="store_true",
+                            help="только проверить кодирование туда-обратно, ничего не записывая")
+    args = arg_parser.parse_args()
+    sys.exit(0 if main(args.files, args.verify) else 1)
@@ -0,0 +1,240 @@
+"""
+VeloTrek — сглаживание высот и подсчёт набора/сброса высоты.
+
+Способ считать набор складывается из двух независимых частей.
+
+Сглаживание (SMOOTHING):
+    points   — скользящее среднее по ELEVATION_WINDOW точкам; ширина окна
+               в метрах зависит от того, как часто стоят точки трека
+    distance — скользящее среднее по DISTANCE_WINDOW_M метрам пути: одно
+               и то же окно и для треков через 20 м, и для треков через 300 м
+    savgol   — фильтр Савицкого–Голея (квадратичный, SAVGOL_WINDOW точек):
+               гасит шум, но меньше, чем среднее, срезает вершины и ямы
+    none     — без сглаживания
+
+Подсчёт (CLIMB):
+    sum        — сумма всех положительных и отрицательных приращений
+    hysteresis — подъём или спуск засчитывается, только когда высота ушла
+                 от последнего экстремума больше чем на CLIMB_THRESHOLD_M:
+                 дрожание высоты на ровном месте не копится
+
+Ширину окна можно поменять (configure(window=...), флаг
+--elevation-window): для points и savgol — в точках, для distance — в
+метрах пути; None — окно способа по умолчанию из констант ниже.
+
+С NumPy всё считается векторно (у hysteresis векторно отбираются
+экстремумы, а проход с порогом идёт уже только по ним), без NumPy — на
+чистом Python; результаты совпадают. Генератор выбирает способ флагами
+--smoothing, --elevation-window и --climb, по умолчанию — points + sum.
+"""
+
+import bisect
+import itertools
+
+try:
+    import numpy as np
+except ImportError:  # NumPy не обязателен — без него работает чистый Python
+    np = None
+
+SMOOTHING = ("points", "distance", "savgol", "none")
+CLIMB = ("sum", "hysteresis")
+DEFAULT_SMOOTHING = "points"
+DEFAULT_CLIMB = "sum"
+
+ELEVATION_WINDOW = 5  # окно скользящего среднего, точек
+DISTANCE_WINDOW_M = 500.0  # окно среднего по расстоянию, м пути
+SAVGOL_WINDOW = 7  # окно фильтра Савицкого–Голея, точек (нечётное)
+CLIMB_THRESHOLD_M = 5.0  # порог гистерезиса, м
+
+_method = {"smoothing": DEFAULT_SMOOTHING, "climb": DEFAULT_CLIMB, "window": None}
+
+
+def check_window(smoothing: str, window):
+    """Проверяет, подходит ли ширина окна способу сглаживания; None — всегда."""
+    if window is None or smoothing == "none":
+        return
+    if smoothing == "distance":
+        if window <= 0:
+            raise ValueError(f"Окно сглаживания по расстоянию должно быть больше 0 м: {window}")
+        return
+    if window != int(window) or window < 1:
+        raise ValueError(f"Окно сглаживания {smoothing} — целое число точек: {window}")
+    if smoothing == "savgol" and (window < 3 or window % 2 == 0):
+        raise ValueError(f"Окно фильтра Савицкого–Голея — нечётное, от 3 точек: {window}")
+
+
+def configure(smoothing: str = None, climb: str = None, window=None) -> dict:
+    """Выбирает способ для всех следующих расчётов в этом процессе.
+
+    window — ширина окна сглаживания (None — окно способа по умолчанию).
+    """
+    smoothing = _method["smoothing"] if smoothing is None else smoothing
+    if smoothing not in SMOOTHING:
+        raise ValueError(f"Неизвестное сглаживание высот: {smoothing}")
+    check_window(smoothing, window)
+    if window is not None and smoothing in ("points", "savgol"):
+        window = int(window)
+    if climb is not None:
+        if climb not in CLIMB:
+            raise ValueError(f"Неизвестный подсчёт набора высоты: {climb}")
+        _method["climb"] = climb
+    _method["smoothing"] = smoothing
+    _method["window"] = window
+    return method()
+
+
+def method() -> dict:
+    """Текущий способ: {"smoothing": ..., "climb": ..., "window": ...}."""
+    return dict(_method)
+
+
+def needs_distance() -> bool:
+    """Нужны ли текущему сглаживанию расстояния до точек."""
+    return _method["smoothing"] == "distance"
+
+
+def _window_sums(eles, start, end):
+    """Средние eles[start[i]:end[i]] по префиксным суммам."""
+    if np is not None:
+        prefix = np.concatenate(([0.0], np.cumsum(eles, dtype=np.float64)))
+        return (prefix[end] - prefix[start]) / (end - start)
+    prefix = [0.0] + list(itertools.accumulate(eles))
+    return [(prefix[e] - prefix[s]) / (e - s) for s, e in zip(start, end)]
+
+
+def smooth_points(eles, window: int = ELEVATION_WINDOW):
+    """Скользящее среднее по window точкам за O(n); у краёв окно усекается."""
+    n = len(eles)
+    half = window // 2
+    if np is not None:
+        idx = np.arange(n)
+        return _window_sums(eles, np.maximum(idx - half, 0), np.minimum(idx + half, n - 1) + 1)
+    return _window_sums(eles, [max(0, i - half) for i in range(n)],
+                        [min(n - 1, i + half) + 1 for i in range(n)])
+
+
+def smooth_distance(eles, dist_m, window_m: float = DISTANCE_WINDOW_M):
+    """Скользящее среднее по точкам в пределах ±window_m/2 метров пути."""
+    half = window_m / 2
+    if np is not None:
+        dist = np.asarray(dist_m, dtype=np.float64)
+        start = np.searchsorted(dist, dist - half, "left")
+        end = np.searchsorted(dist, dist + half, "right")
+        return _window_sums(eles, start, end)
+    start = [bisect.bisect_left(dist_m, d - half) for d in dist_m]
+    end = [bisect.bisect_right(dist_m, d + half) for d in dist_m]
+    return _window_sums(eles, start, end)
+
+
+def savgol_coefficients(window: int = SAVGOL_WINDOW) -> list:
+    """Веса сглаживающего фильтра Савицкого–Голея 2-го порядка.
+
+    Для окна 2m+1 у квадратичной (и кубической) аппроксимации веса в центре
+    выражаются формулой: (3(3m² + 3m − 1) − 15k²) / ((2m − 1)(2m + 1)(2m + 3)).
+    """
+    m = window // 2
+    denominator = (2 * m - 1) * (2 * m + 1) * (2 * m + 3)
+    return [(3 * (3 * m * m + 3 * m - 1) - 15 * k * k) / denominator for k in range(-m, m + 1)]
+
+
+def smooth_savgol(eles, window: int = SAVGOL_WINDOW):
+    """Фильтр Савицкого–Голея по точкам; за краями трека повторяется крайняя высота."""
+    n = len(eles)
+    m = window // 2
+    if n <= 2 * m:
+        return smooth_points(eles, window)
+    weights = savgol_coefficients(window)
+    if np is not None:
+        padded = np.concatenate((np.full(m, eles[0]), eles, np.full(m, eles[-1])))
+        return np.convolve(padded, weights[::-1], "valid")
+    padded = [eles[0]] * m + list(eles) + [eles[-1]] * m
+    return [sum(w * padded[i + k] for k, w in enumerate(weights)) for i in range(n)]
+
+
+def smooth(eles, dist_m=None, *, window=None):
+    """Сглаживает высоты сегмента текущим способом.
+
+    eles — высоты точек (список или массив NumPy), dist_m — расстояния до
+    них от начала сегмента в метрах; нужны только для distance. window
+    заменяет окно, выбранное configure (None — оставить его).
+    """
+    smoothing = _method["smoothing"]
+    if window is None:
+        window = _method["window"]
+    else:
+        check_window(smoothing, window)
+    if smoothing == "points":
+        return smooth_points(eles, ELEVATION_WINDOW if window is None else int(window))
+    if smoothing == "distance":
+        return smooth_distance(eles, dist_m, DISTANCE_WINDOW_M if window is None else float(window))
+    if smoothing == "savgol":
+        return smooth_savgol(eles, SAVGOL_WINDOW if window is None else int(window))
+    return np.asarray(eles, dtype=np.float64) if np is not None else list(eles)
+
+
+def _sum_climb(smoothed) -> tuple:
+    if np is not None:
+        diffs = np.diff(smoothed)
+        return float(diffs[diffs > 0].sum()), -float(diffs[diffs <= 0].sum())
+    climb = descent = 0.0
+    for i in range(1, len(smoothed)):
+        diff = smoothed[i] - smoothed[i - 1]
+        if diff > 0:
+            climb += diff
+        else:
+            descent -= diff
+    return climb, descent
+
+
+def _turning_points(values):
+    """Начало, конец и локальные экстремумы ряда (без ровных участков)."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 3:
+        return values.tolist()
+    values = values[np.concatenate(([True], values[1:] != values[:-1]))]
+    sign = np.sign(np.diff(values))
+    turns = np.flatnonzero(sign[1:] != sign[:-1]) + 1
+    return values[np.concatenate(([0], turns, [len(values) - 1]))].tolist()
+
+
+def _hysteresis_climb(values, threshold: float = CLIMB_THRESHOLD_M) -> tuple:
+    """Набор и спуск с порогом: ход засчитывается, когда развернулся на threshold."""
+    if np is not None:
+        values = _turning_points(values)
+    if len(values) < 2:
+        return 0.0, 0.0
+    climb = descent = 0.0
+    low = high = values[0]
+    up = None  # направление ещё не определено
+    pivot = extreme = values[0]
+    for v in values[1:]:
+        if up is None:
+            low, high = min(low, v), max(high, v)
+            if v - low >= threshold:
+                up, pivot, extreme = True, low, v
+            elif high - v >= threshold:
+                up, pivot, extreme = False, high, v
+        elif up:
+            if v > extreme:
+                extreme = v
+            elif extreme - v >= threshold:
+                climb += extreme - pivot
+                up, pivot, extreme = False, extreme, v
+        else:
+            if v < extreme:
+                extreme = v
+            elif v - extreme >= threshold:
+                descent += pivot - extreme
+                up, pivot, extreme = True, extreme, v
+    if up:
+        climb += extreme - pivot
+    elif up is False:
+        descent += pivot - extreme
+    return climb, descent
+
+
+def climb_descent(smoothed) -> tuple:
+    """Суммарный подъём и спуск (м) по сглаженным высотам одного сегмента."""
+    if _method["climb"] == "hysteresis":
+        return _hysteresis_climb(smoothed)
+    return _sum_climb(smoothed)
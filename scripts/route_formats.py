@@ -0,0 +1,340 @@
+"""
+VeloTrek — потоковое чтение GPX, TCX и GeoJSON.
+
+Каждый читатель принимает бинарный файловый объект и отдаёт по ходу
+разбора элементы маршрута:
+    ("name", текст), ("description", текст) — название и описание
+    ("segment", array("d") из троек lat, lon, ele) — один кусок трека
+    ("poi", {"name", "lat", "lon"}) — точка интереса
+Генератор (collect_route в generate-index.py) собирает из них те же
+метаданные, что и из KML, так что статистика, кэш и карточки маршрутов
+от формата не зависят. Нет высоты — ele = 0, как в KML без высот.
+
+XML (GPX, TCX) разбирается expat по кускам, без дерева элементов: в
+памяти — только уже прочитанные точки трека. GeoJSON тоже читается
+кусками: массив features разбирается по одному объекту, в памяти —
+только текущий Feature.
+"""
+
+import codecs
+import json
+import math
+from array import array
+from xml.parsers import expat
+
+ROUTE_SUFFIXES = (".kml", ".kmz", ".gpx", ".tcx", ".geojson")  # файлы маршрутов в routes/<раздел>/
+XML_CHUNK = 1 << 16
+JSON_CHUNK = 1 << 16
+
+
+def _float(text, default=None):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return default
+
+
+def _iter_xml(source, tags: set, handler, error: str):
+    """Потоковый разбор XML через expat: элементы не строятся вовсе.
+
+    handler(event, name, value, path) вызывается для тегов из tags на
+    "start" (value — атрибуты) и "end" (value — текст элемента); name —
+    имя тега без пространства имён, так что GPX 1.0 и 1.1, TCX v1 и v2
+    читаются одинаково; path — имена открытых родителей. Остальные теги
+    (время, пульс, расширения) только проходятся, их текст входит в текст
+    отслеживаемого элемента вокруг: <desc>Текст <b>x</b></desc> даёт
+    "Текст x". Всё, что handler возвращает (кроме None), отдаётся после
+    каждого прочитанного куска.
+    """
+    parser = expat.ParserCreate(namespace_separator=" ")
+    parser.buffer_text = True
+    names = {}  # полное имя -> локальное
+    path = []
+    text = []
+    out = []
+
+    def start(name, attrs):
+        local = names.get(name) or names.setdefault(name, name.rpartition(" ")[2])
+        if local in tags:
+            text.clear()
+            item = handler("start", local, attrs, path)
+            if item is not None:
+                out.append(item)
+        path.append(local)
+
+    def end(name):
+        local = path.pop()
+        if local in tags:
+            item = handler("end", local, "".join(text).strip(), path)
+            if item is not None:
+                out.append(item)
+            text.clear()
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = text.append
+    try:
+        for chunk in iter(lambda: source.read(XML_CHUNK), b""):
+            parser.Parse(chunk, False)
+            yield from out
+            out.clear()
+        parser.Parse(b"", True)
+    except expat.ExpatError as e:
+        raise ValueError(f"{error}: {e}")
+    yield from out
+
+
+def read_gpx(source):
+    """GPX: trk/trkseg/trkpt и rte/rtept — куски трека, wpt — POI.
+
+    Название и описание — из metadata (в GPX 1.0 — из корня), а если их
+    нет — из первого трека или маршрута.
+    """
+    state = {"points": array("d"), "point": None, "wpt": None}
+
+    def handle(event, name, value, path):
+        parent = path[-1] if path else ""
+        if event == "start":
+            if name in ("trkpt", "rtept", "wpt"):
+                lat, lon = _float(value.get("lat")), _float(value.get("lon"))
+                point = [lat, lon, 0.0] if lat is not None and lon is not None else None
+                state["wpt" if name == "wpt" else "point"] = point
+                if name == "wpt" and point is not None:
+                    point.append("")
+            return None
+        if name in ("trkpt", "rtept"):
+            if state["point"] is not None:
+                state["points"].extend(state["point"])
+        elif name == "ele" and parent in ("trkpt", "rtept"):
+            if state["point"] is not None:
+                state["point"][2] = _float(value, 0.0)
+        elif name in ("trkseg", "rte"):
+            points, state["points"] = state["points"], array("d")
+            if points:
+                return "segment", points
+        elif name == "wpt":
+            wpt = state["wpt"]
+            if wpt is not None:
+                return "poi", {"name": wpt[3], "lat": wpt[0], "lon": wpt[1]}
+        elif name == "name" and parent == "wpt":
+            if state["wpt"] is not None:
+                state["wpt"][3] = value
+        elif name == "name" and parent in ("gpx", "metadata", "trk", "rte"):
+            return "name", value
+        elif name == "desc" and parent in ("gpx", "metadata", "trk", "rte"):
+            return "description", value
+        return None
+
+    tags = {"trkpt", "rtept", "wpt", "ele", "trkseg", "rte", "name", "desc"}
+    return _iter_xml(source, tags, handle, "Ошибка парсинга GPX")
+
+
+def read_tcx(source):
+    """TCX: каждый Track (круга активности или курса) — кусок трека, CoursePoint — POI.
+
+    Trackpoint без Position (только пульс, каденс) пропускаются.
+    """
+    state = {"points": array("d"), "point": None}
+
+    def handle(event, name, value, path):
+        parent = path[-1] if path else ""
+        if event == "start":
+            if name in ("Trackpoint", "CoursePoint"):
+                state["point"] = {"lat": None, "lon": None, "ele": 0.0, "name": ""}
+            return None
+        point = state["point"]
+        if name == "LatitudeDegrees" and point is not None:
+            point["lat"] = _float(value)
+        elif name == "LongitudeDegrees" and point is not None:
+            point["lon"] = _float(value)
+        elif name == "AltitudeMeters" and parent == "Trackpoint":
+            point["ele"] = _float(value, 0.0)
+        elif name == "Trackpoint":
+            if point["lat"] is not None and point["lon"] is not None:
+                state["points"].extend((point["lat"], point["lon"], point["ele"]))
+            state["point"] = None
+        elif name == "Track":
+            points, state["points"] = state["points"], array("d")
+            if points:
+                return "segment", points
+        elif name == "Name" and parent == "CoursePoint":
+            point["name"] = value
+        elif name == "CoursePoint":
+            state["point"] = None
+            if point["lat"] is not None and point["lon"] is not None:
+                return "poi", {"name": point["name"], "lat": point["lat"], "lon": point["lon"]}
+        elif name == "Name" and parent == "Course":
+            return "name", value
+        elif name == "Notes" and parent in ("Course", "Activity"):
+            return "description", value
+        return None
+
+    tags = {"Trackpoint", "CoursePoint", "LatitudeDegrees", "LongitudeDegrees", "AltitudeMeters",
+            "Track", "Name", "Notes"}
+    return _iter_xml(source, tags, handle, "Ошибка парсинга TCX")
+
+
+class _JsonStream:
+    """Текст JSON-файла, подчитываемый кусками по мере разбора."""
+
+    def __init__(self, source):
+        self.source = source
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.json = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read(self, size: int = JSON_CHUNK) -> bool:
+        if self.eof:
+            return False
+        data = self.source.read(size)
+        self.eof = not data
+        # Разобранное начало буфера больше не нужно
+        self.buf = self.buf[self.pos:] + self.decoder.decode(data, final=self.eof)
+        self.pos = 0
+        return not self.eof or bool(self.buf)
+
+    def peek(self) -> str:
+        """Следующий значимый символ ("" в конце файла)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof or not self._read():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Ошибка парсинга GeoJSON: ожидалось {' или '.join(chars)}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Следующее значение JSON целиком; буфер дочитывается, пока значение не закончится."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buf, self.pos)
+                # Число у края буфера может продолжаться в следующем куске
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise ValueError(f"Ошибка парсинга GeoJSON: {e}")
+            # Большие объекты дочитываются с удвоением, чтобы не разбирать их заново много раз
+            self._read(max(JSON_CHUNK, len(self.buf) - self.pos))
+
+
+def _iter_geojson(source):
+    """Члены корневого объекта: ("member", ключ, значение); features — ("feature", объект) по одному."""
+    stream = _JsonStream(source)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key == "features" and stream.peek() == "[":
+            stream.expect("[")
+            if stream.peek() != "]":
+                while True:
+                    yield "feature", stream.value()
+                    if stream.expect(",]") == "]":
+                        break
+            else:
+                stream.expect("]")
+        else:
+            yield "member", key, stream.value()
+        if stream.expect(",}") == "}":
+            return
+
+
+def _position(coords):
+    """(lat, lon, ele) из позиции GeoJSON [lon, lat, ele?] или None, если она испорчена.
+
+    Как и битые точки KML, GPX и TCX, такие позиции (null, строка вместо
+    массива, нечисловые координаты) пропускаются, а не ломают маршрут.
+    """
+    if not isinstance(coords, list) or len(coords) < 2:
+        return None
+    lon, lat = (None if isinstance(v, bool) else _float(v) for v in coords[:2])
+    if lon is None or lat is None or not (math.isfinite(lat) and math.isfinite(lon)):
+        return None
+    ele = _float(coords[2], 0.0) if len(coords) > 2 and not isinstance(coords[2], bool) else 0.0
+    return lat, lon, ele if math.isfinite(ele) else 0.0
+
+
+def _geometry_items(geometry: dict, properties: dict):
+    kind = geometry.get("type") if isinstance(geometry, dict) else None
+    if kind == "Point":
+        position = _position(geometry.get("coordinates"))
+        if position is not None:
+            name = properties.get("name") or properties.get("title") or ""
+            yield "poi", {"name": str(name), "lat": position[0], "lon": position[1]}
+    elif kind in ("LineString", "MultiLineString"):
+        lines = [geometry.get("coordinates")] if kind == "LineString" else geometry.get("coordinates")
+        for line in lines if isinstance(lines, list) else ():
+            points = array("d")
+            for coords in line if isinstance(line, list) else ():
+                position = _position(coords)
+                if position is not None:
+                    points.extend(position)
+            if points:
+                yield "segment", points
+    elif kind == "GeometryCollection":
+        parts = geometry.get("geometries")
+        for part in parts if isinstance(parts, list) else ():
+            yield from _geometry_items(part, properties)
+
+
+def _feature_items(feature: dict):
+    if not isinstance(feature, dict):
+        return
+    properties = feature.get("properties")
+    properties = properties if isinstance(properties, dict) else {}
+    items = list(_geometry_items(feature.get("geometry"), properties))
+    if any(item[0] == "segment" for item in items):
+        if properties.get("name"):
+            yield "name", str(properties["name"])
+        desc = properties.get("description") or properties.get("desc")
+        if desc:
+            yield "description", str(desc)
+    yield from items
+
+
+def read_geojson(source):
+    """GeoJSON: LineString и MultiLineString — куски трека, Point — POI.
+
+    Корень — FeatureCollection, Feature или голая геометрия. Название —
+    из "name" корня (так пишут ogr2ogr и большинство конвертеров), иначе
+    из properties первой линии.
+    """
+    root = {}
+    texts = {}  # название и описание из свойств линий — если у корня их нет
+    for item in _iter_geojson(source):
+        if item[0] == "member":
+            root[item[1]] = item[2]
+            continue
+        for part in _feature_items(item[1]):
+            if part[0] in ("name", "description"):
+                texts.setdefault(part[0], part[1])
+            else:
+                yield part
+
+    kind = root.get("type")
+    if kind == "Feature":
+        for part in _feature_items(root):
+            if part[0] in ("name", "description"):
+                texts.setdefault(part[0], part[1])
+            else:
+                yield part
+    elif kind != "FeatureCollection":
+        yield from _geometry_items(root, {})
+    for key in ("name", "description"):
+        text = root.get(key) or texts.get(key)
+        if text:
+            yield key, str(text)
@@ -0,0 +1,226 @@
+"""
+VeloTrek — упрощение и компактное кодирование геометрии треков.
+
+Douglas–Peucker по локальной равнопромежуточной проекции (метры) и
+Google encoded polyline. Используется scripts/generate-index.py для
+превью маршрутов на разных масштабах карты.
+"""
+
+import math
+
+try:
+    import numpy as np
+except ImportError:  # NumPy не обязателен — без него работает чистый Python
+    np = None
+
+# Допуск упрощения (м) для каждого уровня детализации — примерно размер
+# пикселя карты на этом зуме в средних широтах
+LOD_TOLERANCES_M = {8: 300.0, 11: 40.0, 14: 5.0}
+DETAIL_TOLERANCE_M = LOD_TOLERANCES_M[14]  # трек в карточке маршрута
+POLYLINE_PRECISION = 5  # знаков после запятой: 5 — ~1 м, 6 — ~10 см
+NUMPY_MIN_SPAN = 128  # пролёты Douglas–Peucker короче этого считаются без NumPy
+
+M_PER_DEG_LAT = 110_574.0
+M_PER_DEG_LON = 111_320.0
+
+
+def _project(points):
+    """Переводит (lat, lon, ...) в локальные метры (x, y) вокруг средней широты."""
+    lat0 = math.radians(sum(p[0] for p in points) / len(points))
+    kx = M_PER_DEG_LON * math.cos(lat0)
+    return [(p[1] * kx, p[0] * M_PER_DEG_LAT) for p in points]
+
+
+def _project_numpy(latlon):
+    kx = M_PER_DEG_LON * math.cos(math.radians(float(latlon[:, 0].mean())))
+    return np.column_stack((latlon[:, 1] * kx, latlon[:, 0] * M_PER_DEG_LAT))
+
+
+def _farthest_python(xy, i, j):
+    """Квадрат наибольшего отклонения точек i+1..j-1 от отрезка i–j и номер этой точки."""
+    ax, ay = xy[i]
+    bx, by = xy[j]
+    dx, dy = bx - ax, by - ay
+    seg2 = dx * dx + dy * dy
+    best, best_k = -1.0, i
+    for k in range(i + 1, j):
+        px, py = xy[k][0] - ax, xy[k][1] - ay
+        if seg2 > 0:
+            t = max(0.0, min(1.0, (px * dx + py * dy) / seg2))
+            ex, ey = px - t * dx, py - t * dy
+        else:
+            ex, ey = px, py
+        d2 = ex * ex + ey * ey
+        if d2 > best:
+            best, best_k = d2, k
+    return best, best_k
+
+
+def _dp_keep_python(xy, tolerance):
+    n = len(xy)
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    tol2 = tolerance * tolerance
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        best, best_k = _farthest_python(xy, i, j)
+        if best > tol2:
+            keep[best_k] = True
+            stack.append((i, best_k))
+            stack.append((best_k, j))
+    return keep
+
+
+def _dp_keep_numpy(xy, tolerance):
+    """Douglas–Peucker по массиву (N, 2): длинные пролёты — векторно, короткие — циклом.
+
+    Вызов NumPy стоит несколько микросекунд независимо от длины, поэтому на
+    пролётах короче NUMPY_MIN_SPAN точек (а их при делении большинство)
+    цикл по списку кортежей быстрее.
+    """
+    n = len(xy)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    tol2 = tolerance * tolerance
+    points = None  # xy списком — для коротких пролётов, строится при первой нужде
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        if j - i < NUMPY_MIN_SPAN:
+            if points is None:
+                points = xy.tolist()
+            best, k = _farthest_python(points, i, j)
+        else:
+            a = xy[i]
+            d = xy[j] - a
+            seg2 = d @ d
+            p = xy[i + 1:j] - a
+            if seg2 > 0:
+                t = np.clip(p @ d / seg2, 0.0, 1.0)
+                p = p - t[:, None] * d
+            d2 = np.einsum("ij,ij->i", p, p)
+            k = int(np.argmax(d2))
+            best = d2[k]
+            k += i + 1
+        if best > tol2:
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return keep
+
+
+def _simplify_array(latlon, tolerance_m: float):
+    """Индексы (массив NumPy) точек массива (N, 2) [lat, lon], оставленных Douglas–Peucker."""
+    if len(latlon) < 3:
+        return np.arange(len(latlon))
+    return np.flatnonzero(_dp_keep_numpy(_project_numpy(latlon), tolerance_m))
+
+
+def simplify_indices(points, tolerance_m: float) -> list:
+    """Индексы точек ломаной (lat, lon, ...), оставленных Douglas–Peucker.
+
+    Отклонение считается до отрезка (а не до бесконечной прямой), поэтому
+    петли и возвраты по своему следу не схлопываются. Первая и последняя
+    точки сохраняются всегда.
+    """
+    if len(points) < 3:
+        return list(range(len(points)))
+    if np is not None:
+        return _simplify_array(np.asarray(points, dtype=np.float64)[:, :2], tolerance_m).tolist()
+    keep = _dp_keep_python(_project(points), tolerance_m)
+    return [i for i, k in enumerate(keep) if k]
+
+
+def simplify(points, tolerance_m: float) -> list:
+    """Упрощённая ломаная: список [lat, lon] точек из simplify_indices."""
+    return [[float(points[i][0]), float(points[i][1])] for i in simplify_indices(points, tolerance_m)]
+
+
+def build_lods(segments, tolerances: dict = LOD_TOLERANCES_M) -> dict:
+    """Упрощённые версии всех сегментов для каждого уровня детализации.
+
+    Уровни строятся от детального к грубому, каждый — из предыдущего, а не
+    из полного трека: так грубые уровни почти ничего не стоят. С NumPy
+    сегменты между уровнями остаются массивами и в списки переводятся один
+    раз в конце. Возвращает {"<zoom>": [[[lat, lon], ...], ...]}.
+    """
+    lods = {}
+    if np is not None:
+        current = [np.asarray(seg, dtype=np.float64) for seg in segments]
+        current = [seg[:, :2] if seg.ndim == 2 else seg.reshape(0, 2) for seg in current]
+    else:
+        current = list(segments)
+    for zoom, tolerance in sorted(tolerances.items(), key=lambda item: item[1]):
+        if np is not None:
+            current = [seg[_simplify_array(seg, tolerance)] for seg in current]
+        else:
+            current = [simplify(seg, tolerance) for seg in current]
+        lods[str(zoom)] = current
+    if np is not None:
+        lods = {zoom: [seg.tolist() for seg in level] for zoom, level in lods.items()}
+    return dict(sorted(lods.items(), key=lambda item: int(item[0])))
+
+
+def encode_polyline(points, precision: int = POLYLINE_PRECISION) -> str:
+    """Кодирует (lat, lon, ...) в строку Google encoded polyline.
+
+    Координаты округляются до precision знаков, в строку пишутся разности
+    соседних точек по 5 бит на символ — обычно 4–6 байт на точку вместо
+    ~20 в JSON-массиве.
+    """
+    factor = 10 ** precision
+    chunks = []
+    prev_lat = prev_lon = 0
+    for p in points:
+        lat = round(float(p[0]) * factor)
+        lon = round(float(p[1]) * factor)
+        for delta in (lat - prev_lat, lon - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_lat, prev_lon = lat, lon
+    return "".join(chunks)
+
+
+def decode_polyline(encoded: str, precision: int = POLYLINE_PRECISION) -> list:
+    """Обратное к encode_polyline: строка -> список [lat, lon]."""
+    factor = 10 ** precision
+    points = []
+    values = [0, 0]
+    index = 0
+    while index < len(encoded):
+        for axis in (0, 1):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            values[axis] += ~(result >> 1) if result & 1 else result >> 1
+        points.append([values[0] / factor, values[1] / factor])
+    return points
+
+
+def encode_lods(lods: dict, precision: int = POLYLINE_PRECISION) -> dict:
+    """build_lods с сегментами, закодированными в encoded polyline."""
+    return {
+        zoom: [encode_polyline(seg, precision) for seg in segments]
+        for zoom, segments in lods.items()
+    }
+
+
+def decode_lods(lods: dict, precision: int = POLYLINE_PRECISION) -> dict:
+    """Обратное к encode_lods."""
+    return {
+        zoom: [decode_polyline(seg, precision) for seg in segments]
+        for zoom, segments in lods.items()
+    }
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+VeloTrek — общие участки маршрутов.
+
+Треки всех маршрутов нарезаются на отрезки не длиннее CELL_M и
+раскладываются по сетке с ячейкой CELL_M метров (синусоидальная проекция
+вокруг среднего меридиана каталога: масштаб по долготе берётся по широте
+самой точки, так что ячейки и метры верны и для маршрутов далеко к северу
+или югу от остальных). Отрезок маршрута A считается общим с маршрутом B,
+если трек B проходит через ту же или соседнюю ячейку, то есть ближе ~2 ячеек. Каждый отрезок проверяет только 9 ячеек
+вокруг себя, поэтому время растёт линейно с суммарной длиной треков, а
+не квадратично с числом маршрутов.
+
+Для пары маршрутов в результат идёт меньшая из двух величин (сколько
+километров A идёт вдоль B и сколько B вдоль A) — так петля или
+повторный проезд одного маршрута не завышают общий участок.
+
+Генератор пишет результат в routes/overlaps.json. Из командной строки:
+    python3 scripts/route_overlap.py [--min-km 1]
+"""
+
+import argparse
+import json
+import math
+from pathlib import Path
+
+import route_geometry
+
+try:
+    import numpy as np
+except ImportError:  # NumPy не обязателен — без него работает чистый Python
+    np = None
+
+CELL_M = 25.0
+MIN_OVERLAP_KM = 0.5  # более короткие общие участки — пересечения дорог, а не совпадения
+OVERLAP_ZOOM = "14"  # уровень превью, по которому ищутся общие участки
+OVERLAPS_FILE = Path(__file__).parent.parent / "routes" / "overlaps.json"
+
+
+def _route_cells(segments, lon0: float, cell_m: float) -> dict:
+    """Ячейки сетки, через которые проходит трек: {(cx, cy): метров трека в ячейке}."""
+    ky = route_geometry.M_PER_DEG_LAT
+    cells = {}
+    for seg in segments:
+        kxs = [route_geometry.M_PER_DEG_LON * math.cos(math.radians(p[0])) for p in seg]
+        for (a, akx), (b, bkx) in zip(zip(seg, kxs), zip(seg[1:], kxs[1:])):
+            ax, ay = (a[1] - lon0) * akx, a[0] * ky
+            bx, by = (b[1] - lon0) * bkx, b[0] * ky
+            # Метры — в локальном масштабе отрезка: в сетке вдали от среднего меридиана есть сдвиг
+            length = math.hypot((b[1] - a[1]) * (akx + bkx) / 2, (b[0] - a[0]) * ky)
+            n = max(1, math.ceil(math.hypot(bx - ax, by - ay) / cell_m))
+            for k in range(n):
+                t = (k + 0.5) / n
+                cell = (math.floor((ax + t * (bx - ax)) / cell_m), math.floor((ay + t * (by - ay)) / cell_m))
+                cells[cell] = cells.get(cell, 0.0) + length / n
+    return cells
+
+
+def _shared_python(route_cells: list) -> dict:
+    """{(i, j): метров трека i рядом с треком j} — перебор 9 ячеек вокруг каждой."""
+    grid = {}  # ячейка -> битовая маска маршрутов, проходящих через неё
+    for i, cells in enumerate(route_cells):
+        bit = 1 << i
+        for cell in cells:
+            grid[cell] = grid.get(cell, 0) | bit
+
+    shared = {}
+    for i, cells in enumerate(route_cells):
+        others = ~(1 << i)
+        for (cx, cy), metres in cells.items():
+            near = 0
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    near |= grid.get((cx + dx, cy + dy), 0)
+            near &= others
+            while near:
+                low = near & -near
+                j = low.bit_length() - 1
+                shared[(i, j)] = shared.get((i, j), 0.0) + metres
+                near ^= low
+    return shared
+
+
+def _route_cells_numpy(segments, lon0: float, cell_m: float):
+    """Как _route_cells, но массивами: (cx, cy, метры) по всем кускам трека."""
+    ky = route_geometry.M_PER_DEG_LAT
+    parts = []
+    for seg in segments:
+        if len(seg) < 2:
+            continue
+        pts = np.asarray(seg, dtype=np.float64)
+        kx = route_geometry.M_PER_DEG_LON * np.cos(np.radians(pts[:, 0]))
+        x, y = (pts[:, 1] - lon0) * kx, pts[:, 0] * ky
+        dx, dy = np.diff(x), np.diff(y)
+        length = np.hypot(np.diff(pts[:, 1]) * (kx[:-1] + kx[1:]) / 2, np.diff(pts[:, 0]) * ky)
+        n = np.maximum(1, np.ceil(np.hypot(dx, dy) / cell_m)).astype(np.int64)
+        edge = np.repeat(np.arange(len(n)), n)
+        k = np.arange(int(n.sum())) - np.repeat(np.cumsum(n) - n, n)
+        t = (k + 0.5) / n[edge]
+        parts.append((
+            np.floor((x[edge] + t * dx[edge]) / cell_m).astype(np.int64),
+            np.floor((y[edge] + t * dy[edge]) / cell_m).astype(np.int64),
+            (length / n)[edge],
+        ))
+    if not parts:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+
+def _shared_numpy(routes: list, lon0: float, cell_m: float):
+    """То же, что _shared_python, векторно.
+
+    Возвращает матрицу (R, R) метров трека i рядом с треком j и длины
+    треков в метрах.
+
+    Ячейки кодируются одним int64; таблица «ячейка -> маршруты в 3×3 вокруг»
+    строится сдвигами кодов, а ячейки каждого маршрута ищутся в ней через
+    searchsorted — без циклов по ячейкам на Python.
+    """
+    count = len(routes)
+    cells = [_route_cells_numpy(segments, lon0, cell_m) for segments in routes]
+    cx = np.concatenate([c[0] for c in cells])
+    cy = np.concatenate([c[1] for c in cells])
+    metres = np.concatenate([c[2] for c in cells])
+    route = np.concatenate([np.full(len(c[0]), i, dtype=np.int64) for i, c in enumerate(cells)])
+    lengths = np.bincount(route, weights=metres, minlength=count)
+    if not len(cx):
+        return np.zeros((count, count)), lengths
+
+    # Код ячейки с запасом в одну ячейку по краям для сдвигов ±1
+    height = int(cy.max() - cy.min()) + 3
+    code = (cx - cx.min() + 1) * height + (cy - cy.min() + 1)
+
+    # Уникальные (маршрут, ячейка) с суммой метров трека в ячейке
+    keys, inverse = np.unique(code * count + route, return_inverse=True)
+    weight = np.bincount(inverse.ravel(), weights=metres)
+    cell_code, cell_route = keys // count, keys % count
+
+    # Маршруты в окрестности 3×3 каждой ячейки, отсортировано по коду
+    offsets = [dx * height + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+    near = np.sort(np.concatenate([(cell_code + off) * count + cell_route for off in offsets]))
+    near = near[np.concatenate(([True], near[1:] != near[:-1]))]  # np.unique, но всегда сортировкой
+    near_code, near_route = near // count, near % count
+
+    left = np.searchsorted(near_code, cell_code, "left")
+    right = np.searchsorted(near_code, cell_code, "right")
+    hits = right - left
+    owner = np.repeat(np.arange(len(cell_code)), hits)
+    position = np.arange(int(hits.sum())) - np.repeat(np.cumsum(hits) - hits, hits) + left[owner]
+    i, j = cell_route[owner], near_route[position]
+    mask = i != j
+    matrix = np.bincount(i[mask] * count + j[mask], weights=weight[owner][mask],
+                         minlength=count * count).reshape(count, count)
+    return matrix, lengths
+
+
+def find_overlaps(routes: dict, cell_m: float = CELL_M, min_km: float = MIN_OVERLAP_KM) -> list:
+    """Общие участки всех пар маршрутов.
+
+    routes — {ключ: [сегменты из (lat, lon, ...)]}. Возвращает пары с общим
+    участком не короче min_km, длинные первыми:
+    [{"routes": [a, b], "km": общий участок, "share": [доля трека a, доля трека b]}].
+    """
+    keys = sorted(routes)
+    lons = [p[1] for key in keys for seg in routes[key] for p in seg]
+    if not lons:
+        return []
+    lon0 = sum(lons) / len(lons)
+
+    if np is not None:
+        matrix, lengths = _shared_numpy([routes[key] for key in keys], lon0, cell_m)
+        rows, cols = np.nonzero(matrix)
+        shared = {(int(i), int(j)): float(matrix[i, j]) for i, j in zip(rows, cols)}
+        lengths = lengths.tolist()
+    else:
+        route_cells = [_route_cells(routes[key], lon0, cell_m) for key in keys]
+        shared = _shared_python(route_cells)
+        lengths = [sum(cells.values()) for cells in route_cells]
+
+    pairs = []
+    for (i, j), metres in shared.items():
+        if i > j:
+            continue
+        back = shared.get((j, i), 0.0)
+        # Общий участок не длиннее более короткого из треков
+        km = min(metres, back, lengths[i], lengths[j]) / 1000
+        if km < min_km:
+            continue
+        pairs.append({
+            "routes": [keys[i], keys[j]],
+            "km": round(km, 1),
+            "share": [round(min(metres / lengths[i], 1.0), 3), round(min(back / lengths[j], 1.0), 3)],
+        })
+    pairs.sort(key=lambda p: (-p["km"], p["routes"]))
+    return pairs
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="VeloTrek — общие участки маршрутов")
+    arg_parser.add_argument("--min-km", type=float, default=0.0,
+                            help="показывать пары с общим участком не короче, км")
+    arg_parser.add_argument("--file", default=str(OVERLAPS_FILE),
+                            help="файл, записанный генератором (по умолчанию routes/overlaps.json)")
+    args = arg_parser.parse_args()
+
+    data = json.loads(Path(args.file).read_text(encoding="utf-8"))
+    for pair in data["pairs"]:
+        if pair["km"] >= args.min_km:
+            a, b = pair["routes"]
+            share_a, share_b = pair["share"]
+            print(f"{pair['km']:7.1f} км  {a} ({share_a:.0%})  ↔  {b} ({share_b:.0%})")
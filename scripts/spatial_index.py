@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+VeloTrek — пространственный индекс маршрутов (упакованное R-дерево).
+
+Элементы индекса — куски треков по CHUNK_POINTS точек с уровня превью
+SPATIAL_ZOOM (допуск упрощения ~40 м — для поиска «рядом» этого с запасом).
+Листья упакованы по STR (Sort-Tile-Recursive): элементы режутся на
+вертикальные полосы по долготе, внутри полосы сортируются по широте и
+группируются по NODE_SIZE. Верхние уровни собираются из подряд идущих
+узлов, поэтому дети узла j уровня L — это узлы j*NODE_SIZE ...
+(j+1)*NODE_SIZE-1 уровня L-1, и хранить ссылки не нужно: всё дерево —
+один плоский массив прямоугольников (как во Flatbush).
+
+Генератор пишет индекс в routes/spatial.json. Запросы из командной строки:
+    python3 scripts/spatial_index.py near 55.75 37.62 --radius 5
+    python3 scripts/spatial_index.py bbox 55.5 37.0 56.0 38.0
+    python3 scripts/spatial_index.py route "Однодневки Подмосковья/01-moskva-reka-1.kml"
+"""
+
+import argparse
+import json
+import math
+import sys
+from pathlib import Path
+
+import route_geometry
+
+NODE_SIZE = 16
+CHUNK_POINTS = 16  # точек трека в одном элементе (соседние делят крайнюю точку)
+SPATIAL_ZOOM = "11"  # уровень превью, по которому строится индекс
+SCALE = 100_000  # прямоугольники хранятся целыми в 1e-5°
+INDEX_FILE = Path(__file__).parent.parent / "routes" / "spatial.json"
+
+
+def _chunks(segment):
+    step = CHUNK_POINTS - 1
+    if len(segment) <= CHUNK_POINTS:
+        yield segment
+        return
+    for start in range(0, len(segment) - 1, step):
+        yield segment[start:start + CHUNK_POINTS]
+
+
+def _box(points) -> list:
+    """[minLat, minLon, maxLat, maxLon] в целых 1e-5°, округление наружу."""
+    lats = [p[0] for p in points]
+    lons = [p[1] for p in points]
+    return [
+        math.floor(min(lats) * SCALE), math.floor(min(lons) * SCALE),
+        math.ceil(max(lats) * SCALE), math.ceil(max(lons) * SCALE),
+    ]
+
+
+def _union(boxes) -> list:
+    return [
+        min(b[0] for b in boxes), min(b[1] for b in boxes),
+        max(b[2] for b in boxes), max(b[3] for b in boxes),
+    ]
+
+
+def _intersects(a, b) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _distance_to_line_km(lat, lon, points) -> float:
+    """Расстояние от точки до ломаной, км (локальная проекция вокруг точки)."""
+    kx = route_geometry.M_PER_DEG_LON * math.cos(math.radians(lat))
+    ky = route_geometry.M_PER_DEG_LAT
+    xy = [((p[1] - lon) * kx, (p[0] - lat) * ky) for p in points]
+    if len(xy) == 1:
+        return math.hypot(*xy[0]) / 1000
+    best = float("inf")
+    for (ax, ay), (bx, by) in zip(xy, xy[1:]):
+        dx, dy = bx - ax, by - ay
+        seg2 = dx * dx + dy * dy
+        t = max(0.0, min(1.0, -(ax * dx + ay * dy) / seg2)) if seg2 > 0 else 0.0
+        best = min(best, math.hypot(ax + t * dx, ay + t * dy))
+    return best / 1000
+
+
+def route_entries(segments) -> list:
+    """Элементы индекса одного маршрута: [[прямоугольник, encoded polyline куска], ...].
+
+    Не зависят от других маршрутов, поэтому генератор считает их вместе с
+    разбором файла и хранит в кэше — индекс каталога собирается из них
+    без разбора геометрии.
+    """
+    return [
+        [_box(chunk), route_geometry.encode_polyline(chunk)]
+        for segment in segments
+        for chunk in _chunks(segment)
+        if len(chunk)
+    ]
+
+
+class SpatialIndex:
+    """Упакованное R-дерево над кусками треков всех маршрутов."""
+
+    def __init__(self, routes, level_bounds, boxes, items, lines, node_size=NODE_SIZE):
+        self.routes = routes  # ключи маршрутов "раздел/файл"
+        self.level_bounds = level_bounds  # конец каждого уровня в boxes, от листьев к корню
+        self.boxes = boxes  # [[minLat, minLon, maxLat, maxLon], ...]
+        self.items = items  # индекс маршрута для каждого листа
+        self.lines = lines  # encoded polyline куска трека для каждого листа
+        self.node_size = node_size
+
+    @classmethod
+    def build(cls, routes: dict, node_size: int = NODE_SIZE) -> "SpatialIndex":
+        """Строит индекс из {ключ маршрута: [сегменты из (lat, lon, ...)]}."""
+        return cls.from_entries({key: route_entries(segments) for key, segments in routes.items()}, node_size)
+
+    @classmethod
+    def from_entries(cls, routes: dict, node_size: int = NODE_SIZE) -> "SpatialIndex":
+        """Строит индекс из {ключ маршрута: route_entries(...)} — без работы с геометрией."""
+        keys = sorted(routes)
+        entries = []  # (box, индекс маршрута, encoded polyline куска)
+        for route_idx, key in enumerate(keys):
+            for box, line in routes[key]:
+                entries.append((box, route_idx, line))
+
+        # STR: полосы по долготе, внутри полосы — по широте
+        leaf_count = math.ceil(len(entries) / node_size)
+        slices = max(1, math.ceil(math.sqrt(leaf_count)))
+        per_slice = slices * node_size
+        entries.sort(key=lambda e: e[0][1] + e[0][3])
+        packed = []
+        for start in range(0, len(entries), per_slice):
+            packed.extend(sorted(entries[start:start + per_slice], key=lambda e: e[0][0] + e[0][2]))
+
+        boxes = [e[0] for e in packed]
+        level_bounds = [len(boxes)]
+        level_start = 0
+        while level_bounds[-1] - level_start > 1:
+            level = boxes[level_start:level_bounds[-1]]
+            level_start = level_bounds[-1]
+            boxes.extend(_union(level[i:i + node_size]) for i in range(0, len(level), node_size))
+            level_bounds.append(len(boxes))
+
+        return cls(
+            routes=keys,
+            level_bounds=level_bounds,
+            boxes=boxes,
+            items=[e[1] for e in packed],
+            lines=[e[2] for e in packed],
+            node_size=node_size,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "nodeSize": self.node_size,
+            "scale": SCALE,
+            "precision": route_geometry.POLYLINE_PRECISION,
+            "routes": self.routes,
+            "levelBounds": self.level_bounds,
+            "boxes": [v for box in self.boxes for v in box],
+            "items": self.items,
+            "lines": self.lines,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SpatialIndex":
+        flat = data["boxes"]
+        return cls(
+            routes=data["routes"],
+            level_bounds=data["levelBounds"],
+            boxes=[flat[i:i + 4] for i in range(0, len(flat), 4)],
+            items=data["items"],
+            lines=data["lines"],
+            node_size=data["nodeSize"],
+        )
+
+    @classmethod
+    def load(cls, path: Path = INDEX_FILE) -> "SpatialIndex":
+        return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+
+    def _search(self, box) -> list:
+        """Номера листьев, прямоугольник которых пересекает box (целые 1e-5°)."""
+        if not self.boxes:
+            return []
+        found = []
+        top = len(self.level_bounds) - 1
+        stack = [(len(self.boxes) - 1, top)]
+        while stack:
+            pos, level = stack.pop()
+            if not _intersects(self.boxes[pos], box):
+                continue
+            if level == 0:
+                found.append(pos)
+                continue
+            level_start = self.level_bounds[level - 1]
+            child_start = (0 if level == 1 else self.level_bounds[level - 2])
+            first = child_start + (pos - level_start) * self.node_size
+            last = min(first + self.node_size, self.level_bounds[level - 1])
+            stack.extend((child, level - 1) for child in range(first, last))
+        return found
+
+    def search_bbox(self, min_lat, min_lon, max_lat, max_lon) -> list:
+        """Маршруты, треки которых заходят в прямоугольник (например, видимую область карты)."""
+        box = [math.floor(min_lat * SCALE), math.floor(min_lon * SCALE),
+               math.ceil(max_lat * SCALE), math.ceil(max_lon * SCALE)]
+        return sorted({self.routes[self.items[leaf]] for leaf in self._search(box)})
+
+    def near(self, lat: float, lon: float, radius_km: float) -> list:
+        """Маршруты в пределах radius_km от точки: [(ключ, расстояние км)], ближние первыми."""
+        dlat = radius_km * 1000 / route_geometry.M_PER_DEG_LAT
+        dlon = radius_km * 1000 / (route_geometry.M_PER_DEG_LON * max(math.cos(math.radians(lat)), 1e-6))
+        box = [math.floor((lat - dlat) * SCALE), math.floor((lon - dlon) * SCALE),
+               math.ceil((lat + dlat) * SCALE), math.ceil((lon + dlon) * SCALE)]
+        best = {}
+        for leaf in self._search(box):
+            route = self.items[leaf]
+            points = route_geometry.decode_polyline(self.lines[leaf])
+            distance = _distance_to_line_km(lat, lon, points)
+            if distance <= radius_km and distance < best.get(route, float("inf")):
+                best[route] = distance
+        return sorted(((self.routes[r], round(d, 2)) for r, d in best.items()), key=lambda rd: rd[1])
+
+    def intersecting_routes(self, key: str) -> list:
+        """Маршруты, куски треков которых пересекаются по прямоугольникам с маршрутом key.
+
+        Быстрый отбор кандидатов на общие участки: пересечение прямоугольников
+        необходимо, но не достаточно для реального перекрытия треков.
+        """
+        route = self.routes.index(key)
+        found = set()
+        for leaf in range(self.level_bounds[0]):
+            if self.items[leaf] == route:
+                found.update(self.items[other] for other in self._search(self.boxes[leaf]))
+        found.discard(route)
+        return sorted(self.routes[r] for r in found)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="VeloTrek — поиск маршрутов по пространственному индексу")
+    arg_parser.add_argument("--index", default=str(INDEX_FILE), help="файл индекса (по умолчанию routes/spatial.json)")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    near_cmd = commands.add_parser("near", help="маршруты рядом с точкой")
+    near_cmd.add_argument("lat", type=float)
+    near_cmd.add_argument("lon", type=float)
+    near_cmd.add_argument("--radius", type=float, default=5.0, help="радиус, км")
+    bbox_cmd = commands.add_parser("bbox", help="маршруты, заходящие в прямоугольник")
+    for name in ("min_lat", "min_lon", "max_lat", "max_lon"):
+        bbox_cmd.add_argument(name, type=float)
+    route_cmd = commands.add_parser("route", help="маршруты, пересекающиеся с данным")
+    route_cmd.add_argument("key", help='ключ маршрута "раздел/файл"')
+    args = arg_parser.parse_args()
+
+    index = SpatialIndex.load(Path(args.index))
+    if args.command == "near":
+        for key, distance in index.near(args.lat, args.lon, args.radius):
+            print(f"{distance:6.2f} км  {key}")
+    elif args.command == "bbox":
+        print("\n".join(index.search_bbox(args.min_lat, args.min_lon, args.max_lat, args.max_lon)))
+    else:
+        if args.key not in index.routes:
+            print(f"Маршрут не найден: {args.key}", file=sys.stderr)
+            sys.exit(1)
+        print("\n".join(index.intersecting_routes(args.key)))
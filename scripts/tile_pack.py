@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+VeloTrek — офлайн-пакет тайлов (.vtpk): один файл вместо тысяч запросов.
+
+Тайлы маршрутов (как их выбирает scripts/tile_planner.py) берутся из
+локальной папки-источника и складываются в один архив с оглавлением.
+Клиент может скачать пакет целиком или читать его Range-запросами:
+сначала заголовок и оглавление, затем нужные тайлы по смещениям.
+
+Раскладка (little-endian):
+    заголовок, 32 байта:
+        magic "VTPK", u16 version, u16 flags (пока 0),
+        u32 tile_count, u32 blob_count,
+        u32 directory_offset, u32 data_offset, u64 data_bytes
+    оглавление, tile_count записей по 16 байт, по возрастанию (z, x, y):
+        u32 (z << 27) | x, u32 y, u32 смещение от data_offset, u32 длина
+    данные — тайлы подряд; одинаковые тайлы (пустое море, лес)
+    хранятся один раз, и несколько записей ссылаются на одно смещение
+
+Записи отсортированы, поэтому тайл находится двоичным поиском по
+оглавлению без распаковки.
+
+    python3 scripts/tile_pack.py build --source "tiles/{z}/{x}/{y}.png" --section "Москва" -o moskva.vtpk
+    python3 scripts/tile_pack.py info moskva.vtpk
+    python3 scripts/tile_pack.py get moskva.vtpk 14/9904/5121 > tile.png
+"""
+
+import argparse
+import bisect
+import hashlib
+import struct
+import sys
+from pathlib import Path
+
+import tile_planner
+
+MAGIC = b"VTPK"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHHIIIIQ")
+_ENTRY = struct.Struct("<IIII")
+
+
+def _tile_id(z: int, x: int) -> int:
+    return (z << 27) | x
+
+
+def build_pack(tile_keys, source: str, output: Path) -> dict:
+    """Собирает пакет из тайлов "z/x/y", которые есть в source.
+
+    source — шаблон пути с {z}, {x}, {y}. Тайлы копируются в пакет
+    потоком, в памяти держится только оглавление. Возвращает статистику:
+    записано, пропущено (нет в источнике), уникальных блобов, байт данных.
+    """
+    tiles = sorted({tuple(map(int, key.split("/"))) for key in tile_keys})
+    entries = []
+    blobs = {}  # sha256 -> (смещение, длина)
+    missing = 0
+    directory_offset = _HEADER.size
+
+    with open(output, "wb") as out:
+        out.seek(directory_offset)
+        present = [t for t in tiles if Path(source.format(z=t[0], x=t[1], y=t[2])).is_file()]
+        missing = len(tiles) - len(present)
+        data_offset = directory_offset + len(present) * _ENTRY.size
+        out.seek(data_offset)
+
+        position = 0
+        for z, x, y in present:
+            data = Path(source.format(z=z, x=x, y=y)).read_bytes()
+            digest = hashlib.sha256(data).digest()
+            if digest not in blobs:
+                blobs[digest] = (position, len(data))
+                out.write(data)
+                position += len(data)
+                if position >= 1 << 32:
+                    raise ValueError("Пакет больше 4 ГБ — разбейте его по разделам или маршрутам")
+            offset, length = blobs[digest]
+            entries.append(_ENTRY.pack(_tile_id(z, x), y, offset, length))
+
+        out.seek(0)
+        out.write(_HEADER.pack(MAGIC, VERSION, 0, len(entries), len(blobs),
+                               directory_offset, data_offset, position))
+        out.write(b"".join(entries))
+
+    return {"tiles": len(entries), "missing": missing, "blobs": len(blobs), "bytes": position}
+
+
+class TilePack:
+    """Чтение .vtpk так же, как это делал бы клиент Range-запросами."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ValueError("Файл слишком короткий для .vtpk")
+            (magic, version, _flags, self.tile_count, self.blob_count,
+             directory_offset, self.data_offset, self.data_bytes) = _HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError("Не .vtpk: неверная сигнатура")
+            if version != VERSION:
+                raise ValueError(f"Неподдерживаемая версия .vtpk: {version}")
+            f.seek(directory_offset)
+            directory = f.read(self.tile_count * _ENTRY.size)
+        entries = list(_ENTRY.iter_unpack(directory))
+        self._keys = [(e[0], e[1]) for e in entries]
+        self._ranges = [(e[2], e[3]) for e in entries]
+
+    def keys(self) -> list:
+        return [f"{tid >> 27}/{tid & ((1 << 27) - 1)}/{y}" for tid, y in self._keys]
+
+    def byte_range(self, z: int, x: int, y: int):
+        """(начало, длина) тайла в файле — для HTTP Range — или None."""
+        key = (_tile_id(z, x), y)
+        i = bisect.bisect_left(self._keys, key)
+        if i == len(self._keys) or self._keys[i] != key:
+            return None
+        offset, length = self._ranges[i]
+        return self.data_offset + offset, length
+
+    def get(self, z: int, x: int, y: int):
+        found = self.byte_range(z, x, y)
+        if found is None:
+            return None
+        start, length = found
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            return f.read(length)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="VeloTrek — офлайн-пакеты тайлов .vtpk")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    build_cmd = commands.add_parser("build", help="собрать пакет для маршрутов или разделов")
+    build_cmd.add_argument("--source", required=True,
+                           help='шаблон пути к тайлам источника, например "tiles/{z}/{x}/{y}.png"')
+    build_cmd.add_argument("--section", action="append", default=[], help="раздел каталога (можно несколько)")
+    build_cmd.add_argument("--route", action="append", default=[], help='маршрут "раздел/файл" (можно несколько)')
+    build_cmd.add_argument("-o", "--output", required=True, help="файл пакета .vtpk")
+    info_cmd = commands.add_parser("info", help="сведения о пакете")
+    info_cmd.add_argument("pack")
+    get_cmd = commands.add_parser("get", help="вывести тайл z/x/y в stdout")
+    get_cmd.add_argument("pack")
+    get_cmd.add_argument("tile", help="z/x/y")
+    args = arg_parser.parse_args()
+
+    if args.command == "build":
+        keys = tile_planner.route_keys(args.section, args.route)
+        if not keys:
+            print("Маршруты не выбраны", file=sys.stderr)
+            sys.exit(1)
+        union = set()
+        for route_tiles in tile_planner.route_tiles(keys).values():
+            union.update(route_tiles)
+        stats = build_pack(union, args.source, Path(args.output))
+        print(f"{args.output}: {stats['tiles']} тайлов ({stats['blobs']} уникальных), "
+              f"{stats['bytes'] / (1024 * 1024):.1f} МБ данных")
+        if stats["missing"]:
+            print(f"  нет в источнике: {stats['missing']} тайлов", file=sys.stderr)
+    elif args.command == "info":
+        pack = TilePack(Path(args.pack))
+        print(f"{pack.path}: {pack.tile_count} тайлов, {pack.blob_count} уникальных, "
+              f"данные с байта {pack.data_offset}, {pack.data_bytes / (1024 * 1024):.1f} МБ")
+    else:
+        z, x, y = map(int, args.tile.split("/"))
+        data = TilePack(Path(args.pack)).get(z, x, y)
+        if data is None:
+            print(f"Тайла {args.tile} нет в пакете", file=sys.stderr)
+            sys.exit(1)
+        sys.stdout.buffer.write(data)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+VeloTrek — план общих офлайн-тайлов для нескольких маршрутов.
+
+Соседние маршруты раздела во многом покрывают одни и те же тайлы, а
+OfflineTiles.downloadTiles качает и хранит их для каждого маршрута
+отдельно. Планировщик считает набор тайлов каждого выбранного маршрута
+(тем же алгоритмом, что и клиент, — offline_tiles.tiles_for_route),
+их объединение и число маршрутов, которым нужен каждый тайл. По этому
+манифесту клиент скачивает общий тайл один раз, а при удалении маршрута
+стирает только тайлы, которые больше никому не нужны.
+
+    python3 scripts/tile_planner.py --section "Однодневки Подмосковья" -o plan.json
+    python3 scripts/tile_planner.py --route "Москва/03-zelyonoe-kolco-moskvy.kmz" --route ...
+    python3 scripts/tile_planner.py --section "Походы 2-3 дня МО" --evict "Походы 2-3 дня МО/01-tver-staritsa.kml"
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import offline_tiles
+import route_formats
+
+ROUTES_DIR = Path(__file__).parent.parent / "routes"
+AVG_TILE_BYTES = 15 * 1024  # как estimateSize в js/offline.js
+
+
+def route_keys(sections=(), routes=()) -> list:
+    """Ключи "раздел/файл" выбранных маршрутов; без фильтров — все маршруты."""
+    found = sorted(
+        f"{p.parent.name}/{p.name}" for p in ROUTES_DIR.glob("*/*")
+        if p.suffix.lower() in route_formats.ROUTE_SUFFIXES
+    )
+    if not sections and not routes:
+        return found
+    return [key for key in found if key.split("/")[0] in sections or key in routes]
+
+
+def route_tiles(keys) -> dict:
+    """{ключ: [тайлы "z/x/y"]} — разбор файлов через parse_kml генератора."""
+    import index_generator
+    generator = index_generator.load()
+
+    tiles = {}
+    for key in keys:
+        meta = generator.load_route_file(ROUTES_DIR / key)
+        tiles[key] = offline_tiles.tiles_for_route(meta["bbox"], meta["segments"]) if meta["bbox"] else []
+    return tiles
+
+
+def reference_counts(tiles: dict) -> dict:
+    """Тайл -> число выбранных маршрутов, которым он нужен."""
+    refs = {}
+    for keys in tiles.values():
+        for key in keys:
+            refs[key] = refs.get(key, 0) + 1
+    return refs
+
+
+def build_plan(tiles: dict) -> dict:
+    """Манифест общей загрузки.
+
+    union — все тайлы выбранных маршрутов, каждый по одному разу (это и
+    нужно скачать); refs["<n>"] — тайлы, нужные ровно n маршрутам, в том
+    же сжатом виде, что и tiles.json (offline_tiles.build_manifest).
+    """
+    refs = reference_counts(tiles)
+    by_count = {}
+    for key, count in refs.items():
+        by_count.setdefault(count, []).append(key)
+
+    requested = sum(len(keys) for keys in tiles.values())
+    return {
+        "zoomMin": offline_tiles.ZOOM_MIN,
+        "zoomMax": offline_tiles.ZOOM_MAX,
+        "routes": sorted(tiles),
+        "stats": {
+            "requested": requested,
+            "unique": len(refs),
+            "shared": sum(1 for count in refs.values() if count > 1),
+            "savedTiles": requested - len(refs),
+            "savedBytesEstimate": (requested - len(refs)) * AVG_TILE_BYTES,
+        },
+        "perRoute": {
+            key: {
+                "tiles": len(keys),
+                "exclusive": sum(1 for k in keys if refs[k] == 1),
+            }
+            for key, keys in sorted(tiles.items())
+        },
+        "union": offline_tiles.build_manifest(refs),
+        "refs": {str(count): offline_tiles.build_manifest(keys) for count, keys in sorted(by_count.items())},
+    }
+
+
+def eviction_plan(tiles: dict, route: str) -> dict:
+    """Что можно удалить вместе с маршрутом route, не сломав остальные выбранные."""
+    others = set()
+    for key, keys in tiles.items():
+        if key != route:
+            others.update(keys)
+    evict = [k for k in tiles[route] if k not in others]
+    return {
+        "route": route,
+        "evict": offline_tiles.build_manifest(evict),
+        "keep": len(tiles[route]) - len(evict),
+    }
+
+
+def _size(tile_count: int) -> str:
+    return f"~{tile_count * AVG_TILE_BYTES / (1024 * 1024):.0f} МБ"
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="VeloTrek — общие офлайн-тайлы нескольких маршрутов")
+    arg_parser.add_argument("--section", action="append", default=[], help="раздел каталога (можно несколько)")
+    arg_parser.add_argument("--route", action="append", default=[], help='маршрут "раздел/файл" (можно несколько)')
+    arg_parser.add_argument("--evict", metavar="ROUTE",
+                            help="какие тайлы можно удалить вместе с маршрутом, не задев остальные выбранные")
+    arg_parser.add_argument("-o", "--output", help="записать манифест в JSON-файл")
+    args = arg_parser.parse_args()
+
+    keys = route_keys(args.section, args.route)
+    if args.evict and args.evict not in keys:
+        keys.append(args.evict)
+    if not keys:
+        print("Маршруты не выбраны", file=sys.stderr)
+        sys.exit(1)
+
+    tiles = route_tiles(keys)
+    if args.evict:
+        result = eviction_plan(tiles, args.evict)
+        print(f"{args.evict}: удалить {result['evict']['count']} тайлов, "
+              f"оставить {result['keep']} (нужны другим маршрутам)")
+    else:
+        result = build_plan(tiles)
+        stats = result["stats"]
+        for key, info in result["perRoute"].items():
+            print(f"  {key}: {info['tiles']} тайлов, из них только его {info['exclusive']}")
+        print(f"\nПо отдельности: {stats['requested']} тайлов ({_size(stats['requested'])}), "
+              f"вместе: {stats['unique']} ({_size(stats['unique'])}), "
+              f"общих: {stats['shared']}, экономия {stats['savedTiles']} тайлов")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, ensure_ascii=False, separators=(",", ":")),
+                                     encoding="utf-8")
@@ -1,6 +1,7 @@
 const SHELL_VERSION = 24;
 const SHELL_CACHE = "velotrek-shell-v" + SHELL_VERSION;
 const ROUTES_CACHE = "velotrek-routes";
+const ROUTE_FILE = /\.(kml|kmz|gpx|tcx|geojson)$/i;
 
 const SHELL_FILES = [
   "./",
@@ -83,8 +84,7 @@ async function migrateRoutesFromOldCache(oldCacheName) {
   for (const request of requests) {
     const url = new URL(request.url);
     const isRoute =
-      url.pathname.endsWith(".kml") ||
-      url.pathname.endsWith(".kmz") ||
+      ROUTE_FILE.test(url.pathname) ||
       url.pathname.endsWith("index.json") ||
       url.hostname === "raw.githubusercontent.com";
     if (isRoute) {
@@ -123,11 +123,8 @@ self.addEventListener("fetch", (event) => {
     return;
   }
 
-  // KML/KMZ файлы из routes/ — network-first → ROUTES_CACHE
-  if (
-    url.pathname.includes("/routes/") &&
-    (url.pathname.endsWith(".kml") || url.pathname.endsWith(".kmz"))
-  ) {
+  // Файлы маршрутов (KML/KMZ, GPX, TCX, GeoJSON) из routes/ — network-first → ROUTES_CACHE
+  if (url.pathname.includes("/routes/") && ROUTE_FILE.test(url.pathname)) {
     event.respondWith(networkFirst(event.request, ROUTES_CACHE));
     return;
   }